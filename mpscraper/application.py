@@ -1,18 +1,48 @@
 from __future__ import annotations
 
 import argparse
+import asyncio
 from datetime import date, datetime, timedelta
+import itertools
+import os
 from pathlib import Path
+import shutil
 import sys
-from typing import Mapping, Set
+from typing import AsyncIterator, Mapping, Set
 
 from loguru import logger
 
-from mpscraper.const import DATABASE_CONNECTION, DUMP_DIR, WORK_DIR
-from mpscraper.crawler import AgilCrawlContents, Credentials, MerPubCrawler, VirtualFile
-from mpscraper.database import merge_agil_models_into_db
+from mpscraper.const import (
+    DATABASE_CONNECTION,
+    DUMP_DIR,
+    IDN_INDEX_FILE,
+    INGEST_BATCH_SIZE,
+    INGEST_QUEUE_SIZE,
+    LOAD_FILES_WORKERS,
+    MANIFEST_FILENAME,
+    PARSE_BATCH_SIZE,
+    SCRAPE_CONCURRENCY,
+    WORK_DIR,
+    configure_logging,
+    ensure_dirs,
+)
+from mpscraper.crawler import (
+    AgilCrawlContents,
+    AsyncMerPubCrawler,
+    Credentials,
+    VirtualFile,
+)
+from mpscraper.database import (
+    configure_engine,
+    engine_options,
+    forget_seen_keys,
+    merge_agil_models_into_db,
+)
 from mpscraper.models import BidStatus
-from mpscraper.parser import parse_agil_into_db_model, parse_agil_search_results_html
+from mpscraper.parser import (
+    parse_agil_into_db_model,
+    parse_agil_search_results_html_stream,
+)
 from mpscraper.validators import validate_rut
 
 
@@ -28,22 +58,72 @@ def prepare_database(engine, session):
     init_database(session)
 
 
-def get_ignores(session):
-    """Obtiene los números de las licitaciones a ignorar cuando se
-    extraigan datos de Mercado Público."""
+def _idn_index_header(session) -> str:
+    """Primera línea del índice local de licitaciones, que identifica la base
+    de datos a la que corresponde sin dejar su contraseña escrita."""
+    import hashlib
+
+    url = session.get_bind().url.render_as_string(hide_password=False)
+    return "# " + hashlib.blake2b(url.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def get_idns_in_db(session) -> set[str]:
+    """Obtiene los números de las licitaciones que están en la base de datos.
+
+    Se leen del índice local ``IDN_INDEX_FILE``; si no existe, es de otra base
+    de datos o no coincide con la cantidad de licitaciones en la base de
+    datos, se consultan a la base de datos y se reescribe el índice."""
     import sqlalchemy
 
     import mpscraper.models
 
-    in_db: set[str] = {
-        row[0].idn for row in session.execute(sqlalchemy.select(mpscraper.models.Bid))
-    }
-    in_cache = {d.name for d in WORK_DIR.glob("*/")}
+    Bid = mpscraper.models.Bid
+    header = _idn_index_header(session)
+    count = session.scalar(sqlalchemy.select(sqlalchemy.func.count(Bid.idn)))
+    if IDN_INDEX_FILE.exists():
+        lines = IDN_INDEX_FILE.read_bytes().decode("utf-8").splitlines()
+        if lines and lines[0] == header:
+            in_index = set(lines[1:])
+            if len(in_index) == count:
+                return in_index
+        logger.debug("Índice de licitaciones desactualizado; reconstruyendo")
+    in_db: set[str] = set(session.scalars(sqlalchemy.select(Bid.idn)).all())
+    IDN_INDEX_FILE.write_text(
+        header + "\n" + "".join(f"{idn}\n" for idn in in_db), "utf-8"
+    )
+    return in_db
+
+
+def append_idn_index(session, idns: list[str]):
+    """Agrega licitaciones recién guardadas en la base de datos al índice
+    local de licitaciones."""
+    try:
+        file = open(IDN_INDEX_FILE, "r+", encoding="utf-8")
+    except FileNotFoundError:
+        return  # se construye completo la próxima vez que se lea
+    with file:
+        if file.readline().rstrip("\n") != _idn_index_header(session):
+            return  # es de otra base de datos; se reconstruye al leerlo
+        file.seek(0, os.SEEK_END)
+        file.write("".join(f"{idn}\n" for idn in idns))
+
+
+def get_ignores(session):
+    """Obtiene los números de las licitaciones a ignorar cuando se
+    extraigan datos de Mercado Público."""
+    in_db = get_idns_in_db(session)
+    with os.scandir(WORK_DIR) as entries:
+        in_cache = {
+            entry.name
+            for entry in entries
+            if entry.is_dir() and not entry.name.startswith(".")
+        }
     return in_db.union(in_cache)
 
 
-def scrape(args, ignores: Set[str]):
-    """Extrae los archivos de licitaciones de Mercado Público."""
+def scrape_params(args) -> tuple[Credentials, BidStatus | str, date, date]:
+    """Valida las opciones de la línea de comandos necesarias para extraer
+    datos y entrega las credenciales, la categoría y el rango de fechas."""
     if not args.login or not args.password:
         ap.error("--login y --password son necesarios si se van a extraer datos")
     username = args.login
@@ -60,118 +140,230 @@ def scrape(args, ignores: Set[str]):
     if args.days_before:
         until = date.today()
         from_ = until - timedelta(args.days_before)
-    elif args.from_ and not args.until:
+    elif args.from_ and args.until:
         until = args.until
         from_ = args.from_
     else:
         ap.error(
             "--from y --until o --days-before son necesarios si se van a extraer datos"
         )
-    limit = args.limit
+    return Credentials(username, password), category, from_, until
+
+
+async def scrape(
+    args,
+    params: tuple[Credentials, BidStatus | str, date, date],
+    ignores: Set[str],
+    concurrency: int = SCRAPE_CONCURRENCY,
+) -> AsyncIterator[tuple[str, AgilCrawlContents]]:
+    """Extrae los archivos de licitaciones de Mercado Público, según lo que
+    entrega ``scrape_params``.
+
+    Las licitaciones se extraen de forma concurrente, hasta ``concurrency`` a
+    la vez, y se entregan a medida que se terminan de extraer."""
+    credentials, category, from_, until = params
     logger.info("Extrayendo datos de Mercado Público")
     result_list = None
     ignore = ignores if args.only_missing else set()
     try:
-        crawler = MerPubCrawler(credentials=Credentials(username, password))
+        crawler = AsyncMerPubCrawler(credentials=credentials)
     except Exception as err:
         logger.error(f"Hubo un error al crear el crawler: {err!r}")
-        return None
-    try:
-        file = crawler.crawl_results_from_agil_params(
-            date_from=from_,
-            date_until=until,
-            status=category,
-        )
-        if not file:
-            raise Exception("No hubieron resultados")
-        result_list = parse_agil_search_results_html(file.content)
-    except Exception as err:
-        logger.error(f"Hubo un error al extraer la lista de resultados: {err!r}")
-        crawler.save_dump(DUMP_DIR)
-        return None
-    limit = min(limit, len(result_list)) or len(result_list)
-    logger.info(f"Se esperan extraer {limit} licitaciones, si no se ignora ninguno")
-    ripped = {}
-    count = 0
-    for idx, idn in enumerate(result_list.keys()):
-        if idn in ignore:
-            logger.info(
-                f"Ignorando licitación {idn!r}, ya se encuentra localmente; ignorando"
-            )
-            limit -= 1
-            continue
+        return
+    async with crawler:
         try:
-            result = crawler.crawl_from_agil_idn(idn)
-            yield idn, result
-            ripped[idn] = result
-            count += 1
-            if count >= limit:
-                break
+            file = await crawler.crawl_results_from_agil_params(
+                date_from=from_,
+                date_until=until,
+                status=category,
+            )
+            if not file:
+                raise Exception("No hubieron resultados")
+            with file.content as fp:
+                result_list = parse_agil_search_results_html_stream(fp)
         except Exception as err:
-            logger.exception(err)
-            logger.error(f"Hubo un error al extraer la licitación {idn!r}, ignorando")
+            logger.error(f"Hubo un error al extraer la lista de resultados: {err!r}")
             crawler.save_dump(DUMP_DIR)
-    if len(ripped) < limit:
+            return
+        limit = min(args.limit or len(result_list), len(result_list))
+        logger.info(f"Se esperan extraer {limit} licitaciones, si no se ignora ninguno")
+        idns = []
+        for idn in itertools.islice(result_list, limit):
+            if idn in ignore:
+                logger.info(
+                    f"Ignorando licitación {idn!r}, ya se encuentra localmente; ignorando"
+                )
+                continue
+            idns.append(idn)
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def _one(idn: str):
+            async with semaphore:
+                try:
+                    return idn, await crawler.crawl_from_agil_idn(idn)
+                except Exception as err:
+                    logger.exception(err)
+                    logger.error(
+                        f"Hubo un error al extraer la licitación {idn!r}, ignorando"
+                    )
+                    crawler.save_dump(DUMP_DIR)
+                    return idn, None
+
+        count = 0
+        for task in asyncio.as_completed([asyncio.create_task(_one(i)) for i in idns]):
+            idn, result = await task
+            if result:
+                count += 1
+                yield idn, result
+    if count < len(idns):
         logger.warning(f"No se extrajeron todas las licitaciones esperadas")
-    logger.success(f"{len(ripped)} licitaciones extraídas")
+    logger.success(f"{count} licitaciones extraídas")
+
+
+def crawl_files(result: AgilCrawlContents) -> list[tuple[str, bytes | Path]]:
+    """Nombres y contenidos de los archivos que se guardan localmente por
+    cada licitación extraída. Los archivos que el crawler ya descargó al
+    disco se entregan como su ruta, para no cargarlos en memoria."""
+    files = [("bid.html", result.main)]
+    if result.bo_pdf:
+        files.append((result.bo_pdf.filename, result.bo_pdf.content))
+    if result.bo_screen:
+        files.append(("bo.html", result.bo_screen))
+    if result.provider_listing:
+        files.append(
+            (result.provider_listing.filename, result.provider_listing.content)
+        )
+    if result.modals:
+        for idx, modal in enumerate(result.modals):
+            files.append((f"modal_{idx}.json", modal or b""))
+    if result.modal_selected:
+        files.append(("selected_modal.json", result.modal_selected))
+    return files
+
+
+def files_manifest(files: list[tuple[str, bytes | Path]]) -> str:
+    """Lista con el nombre, tamaño y hash de cada archivo, para saber si los
+    archivos guardados de una licitación cambiaron."""
+    import hashlib
+
+    lines = []
+    for filename, content in files:
+        if isinstance(content, Path):
+            with open(content, "rb") as file:
+                digest = hashlib.file_digest(
+                    file, lambda: hashlib.blake2b(digest_size=16)
+                ).hexdigest()
+            size = content.stat().st_size
+        else:
+            digest = hashlib.blake2b(content, digest_size=16).hexdigest()
+            size = len(content)
+        lines.append(f"{filename}\t{size}\t{digest}\n")
+    return "".join(lines)
 
 
 def save_files(ripped: Mapping[str, AgilCrawlContents]):
-    import shutil
+    """Guarda los archivos extraídos en una carpeta por licitación.
 
+    Cada carpeta se escribe primero en una carpeta temporal oculta y luego
+    se reemplaza de una vez, para que una interrupción no deje carpetas a
+    medio escribir que después se confundan con licitaciones completas."""
     tmpdir = WORK_DIR
-    logger.info("Guardando archivos extraídos de forma local")
+    logger.info(f"Guardando {len(ripped)} licitaciones extraídas de forma local")
     for idn, result in ripped.items():
         savedir: Path = tmpdir / idn
+        files = crawl_files(result)
+        manifest = files_manifest(files)
+        manifest_path = savedir / MANIFEST_FILENAME
+        if manifest_path.exists() and manifest_path.read_text() == manifest:
+            logger.debug(f"Archivos de licitación {idn!r} sin cambios")
+            continue
+        staging = tmpdir / f".{idn}.tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir()
+        for filename, content in files:
+            if isinstance(content, Path):
+                shutil.copyfile(content, staging / filename)
+            else:
+                (staging / filename).write_bytes(content)
+        (staging / MANIFEST_FILENAME).write_text(manifest)
         if savedir.exists():
-            shutil.rmtree(savedir)
-        savedir.mkdir(exist_ok=True)
-        (savedir / "bid.html").write_text(result.main, encoding="utf-8")
-        if result.bo_pdf:
-            (savedir / result.bo_pdf.filename).write_bytes(result.bo_pdf.content)
-        if result.bo_screen:
-            (savedir / "bo.html").write_text(result.bo_screen, encoding="utf-8")
-        if result.provider_listing:
-            (savedir / result.provider_listing.filename).write_text(
-                result.provider_listing.content, encoding="utf-8"
-            )
-        if result.modals:
-            for idx, modal in enumerate(result.modals):
-                (savedir / f"modal_{idx}.json").write_text(
-                    modal or "", encoding="utf-8"
-                )
-        if result.modal_selected:
-            (savedir / f"selected_modal.json").write_text(
-                result.modal_selected, encoding="utf-8"
-            )
+            old = tmpdir / f".{idn}.old"
+            shutil.rmtree(old, ignore_errors=True)
+            os.replace(savedir, old)
+            os.replace(staging, savedir)
+            shutil.rmtree(old)
+        else:
+            os.replace(staging, savedir)
 
 
-def load_files() -> Mapping[str, AgilCrawlContents]:
-    """Carga los archivos locales de licitaciones."""
-    tmpdir = Path("./__workdir__")
-    tmpdir.mkdir(exist_ok=True)
-    ripped: Mapping[str, AgilCrawlContents] = {}
-    for folder in tmpdir.glob("*/"):
-        modals = [fn.read_text("utf-8") for fn in folder.glob("modal_*.json")]
-        provider_listing = next(folder.glob("ProveedoresCotizacionCAgil_*.xls"))
-        provider_listing = (
-            VirtualFile(provider_listing.name, provider_listing.read_text("utf-8"))
-            if provider_listing
-            else None
-        )
-        modal_selected = next(folder.glob("selected_modal.json"))
-        modal_selected = modal_selected.read_text("utf-8") if modal_selected else None
-        main = (folder / "bid.html").read_text("utf-8")
-        ripped[folder.name] = AgilCrawlContents(
-            main, modals, modal_selected, provider_listing, None, None
-        )
-    return ripped
+def _read_bytes(path) -> bytes:
+    with open(path, "rb") as file:
+        return file.read()
 
 
-def parse(session, agils: Mapping[str, AgilCrawlContents]):
-    """Parsea y crea modelos de archivos extraídos de licitaciones."""
+def _load_one_folder(folder: os.DirEntry) -> tuple[str, AgilCrawlContents]:
+    """Carga los archivos de una licitación desde su carpeta local."""
+    modals = {}
+    provider_listing = None
+    modal_selected = None
+    main = None
+    with os.scandir(folder.path) as entries:
+        for entry in entries:
+            name = entry.name
+            if name.startswith("modal_") and name.endswith(".json"):
+                modals[int(name[len("modal_") : -len(".json")])] = _read_bytes(entry)
+            elif name.startswith("ProveedoresCotizacionCAgil_") and name.endswith(
+                ".xls"
+            ):
+                provider_listing = VirtualFile(name, _read_bytes(entry))
+            elif name == "selected_modal.json":
+                modal_selected = _read_bytes(entry)
+            elif name == "bid.html":
+                main = _read_bytes(entry)
+    if main is None:
+        raise FileNotFoundError(os.path.join(folder.path, "bid.html"))
+    return folder.name, AgilCrawlContents(
+        main,
+        [modals[idx] for idx in sorted(modals)],
+        modal_selected,
+        provider_listing,
+        None,
+        None,
+    )
+
+
+def load_files(workers: int = LOAD_FILES_WORKERS) -> Mapping[str, AgilCrawlContents]:
+    """Carga los archivos locales de licitaciones.
+
+    Las carpetas se leen en paralelo con ``workers`` hilos, ya que el tiempo
+    se va en esperar la lectura de muchos archivos pequeños."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    with os.scandir(WORK_DIR) as entries:
+        folders = [
+            entry
+            for entry in entries
+            if entry.is_dir() and not entry.name.startswith(".")
+        ]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(executor.map(_load_one_folder, folders))
+
+
+def parse(
+    session,
+    agils: Mapping[str, AgilCrawlContents],
+    batch_size: int = PARSE_BATCH_SIZE,
+):
+    """Parsea y crea modelos de archivos extraídos de licitaciones.
+
+    Un error al ingresar una licitación solo deshace esa licitación, y se
+    hace commit cada ``batch_size`` licitaciones."""
     logger.info(f"Añadiendo modelos de {len(agils)} entradas de licitaciones ágiles")
     count = 0
+    merged = 0
+    # solo las licitaciones nuevas se agregan al índice local
+    inserted = []
     for idn, agil in agils.items():
         try:
             models = parse_agil_into_db_model(agil)
@@ -182,25 +374,98 @@ def parse(session, agils: Mapping[str, AgilCrawlContents]):
             )
             continue
         try:
-            merge_agil_models_into_db(session, models)
-            session.commit()
-            count += 1
+            if merge_agil_models_into_db(session, models):
+                inserted.append(idn)
+            merged += 1
         except Exception as err:
             logger.exception(err)
             logger.error(
                 f"Hubo un error al ingresar los datos de licitación {idn!r} parseados a la base de datos"
             )
-            session.rollback()
+        if merged >= batch_size:
+            count += _commit_batch(session, inserted)
+            merged = 0
+            inserted = []
+    if merged:
+        count += _commit_batch(session, inserted)
     if count:
         logger.success("Base de datos actualizada con nuevos datos")
 
 
-def date_arg(value: str):
+def _commit_batch(session, idns: list[str]) -> int:
+    """Hace commit de las licitaciones ingresadas en la sesión y entrega
+    cuántas se guardaron; ``idns`` son solo las licitaciones nuevas."""
     try:
-        return datetime.strptime(value, r"%Y-%m-%d") if value else None
+        session.commit()
+    except Exception as err:
+        logger.exception(err)
+        logger.error("Hubo un error al guardar licitaciones en la base de datos")
+        session.rollback()
+        forget_seen_keys(session)
+        return 0
+    logger.debug(f"{len(idns)} licitaciones nuevas guardadas en la base de datos")
+    if idns:
+        append_idn_index(session, idns)
+    return len(idns)
+
+
+def ingest_batch(session, args, batch: Mapping[str, AgilCrawlContents]):
+    """Guarda localmente y/o ingresa a la base de datos un lote de
+    licitaciones extraídas, según las opciones de la línea de comandos."""
+    if not batch:
+        return
+    if args.save_files:
+        save_files(batch)
+    if args.merge:
+        parse(session, batch)
+
+
+async def _ingest_batch_in_thread(
+    session, args, batch: Mapping[str, AgilCrawlContents]
+):
+    # el parseo usa la CPU; se hace en otro hilo para que la extracción siga
+    # avanzando
+    task = asyncio.ensure_future(asyncio.to_thread(ingest_batch, session, args, batch))
+    try:
+        await asyncio.shield(task)
+    except asyncio.CancelledError:
+        # el hilo no se puede cancelar y sigue usando la sesión; se espera a
+        # que termine para que no se cierre la sesión mientras tanto
+        await asyncio.wait({task})
+        raise
+
+
+async def ingest(
+    session, args, queue: asyncio.Queue, batch_size: int = INGEST_BATCH_SIZE
+) -> int:
+    """Consume las licitaciones que ``scrape`` deja en ``queue`` hasta recibir
+    ``None`` y las ingresa en lotes mientras la extracción continúa. Entrega
+    cuántas licitaciones se consumieron."""
+    count = 0
+    batch = {}
+    try:
+        while (item := await queue.get()) is not None:
+            idn, scraped = item
+            batch[idn] = scraped
+            count += 1
+            if len(batch) >= batch_size:
+                pending, batch = batch, {}
+                await _ingest_batch_in_thread(session, args, pending)
+        pending, batch = batch, {}
+        await _ingest_batch_in_thread(session, args, pending)
+    finally:
+        # se guarda lo extraído aunque se interrumpa la extracción
+        if args.save_files and batch:
+            save_files(batch)
+    return count
+
+
+def date_arg(value: str) -> date | None:
+    try:
+        return datetime.fromisoformat(value).date() if value else None
     except ValueError:
-        return argparse.ArgumentTypeError(
-            "{value!r} no es un formato de fecha válido (AAAA-MM-DD)"
+        raise argparse.ArgumentTypeError(
+            f"{value!r} no es un formato de fecha válido (AAAA-MM-DD)"
         )
 
 
@@ -271,15 +536,23 @@ ap.add_argument(
 
 
 def main():
+    return asyncio.run(main_async())
+
+
+async def main_async():
     import sqlalchemy
     import sqlalchemy.orm
 
     args = ap.parse_args()
+    params = scrape_params(args) if args.scrape else None
+    configure_logging()
+    ensure_dirs()
 
     con_string = args.database or DATABASE_CONNECTION
     logger.info(f"Conectado a la base de datos {con_string!r}")
     try:
-        engine = sqlalchemy.create_engine(con_string)
+        engine = sqlalchemy.create_engine(con_string, **engine_options(con_string))
+        configure_engine(engine)
     except Exception as err:
         logger.error(f"Error al conectar a la base de datos {con_string!r}!")
         logger.error(err)
@@ -289,16 +562,20 @@ def main():
         prepare_database(engine, session)
         ignores = get_ignores(session)
 
-    files = {}
-    if args.scrape:
-        for idx, scraped in scrape(args, ignores):
-            if scraped:
-                files[idx] = scraped
-                if args.save_files:
-                    save_files({idx: scraped})
-    if not files:
-        files = load_files()
-
     with Session() as session:
-        if args.merge:
-            parse(session, files)
+        scraped = 0
+        if args.scrape:
+            queue = asyncio.Queue(maxsize=INGEST_QUEUE_SIZE)
+
+            async def produce():
+                async for idn, contents in scrape(args, params, ignores):
+                    if contents:
+                        await queue.put((idn, contents))
+                await queue.put(None)
+
+            async with asyncio.TaskGroup() as tg:
+                tg.create_task(produce())
+                consumer = tg.create_task(ingest(session, args, queue))
+            scraped = consumer.result()
+        if not scraped and args.merge:
+            parse(session, load_files())
@@ -2,12 +2,58 @@ from pathlib import Path
 
 from loguru import logger
 
-logger.add(sink="log.txt")
+LOG_FILE = Path("log.txt")
 
 DUMP_DIR = Path("__dump__")
-DUMP_DIR.mkdir(exist_ok=True)
 
 WORK_DIR = Path("./__workdir__")
-WORK_DIR.mkdir(exist_ok=True)
+# lista de archivos guardados en cada carpeta de licitación
+MANIFEST_FILENAME = ".manifest"
+# números de las licitaciones guardadas en la base de datos
+IDN_INDEX_FILE = WORK_DIR / ".idn_index"
 
 DATABASE_CONNECTION = "sqlite:///database.sqlite3"
+
+# filas por sentencia en los INSERT de varias filas (PostgreSQL)
+INSERT_PAGE_SIZE = 5000
+
+# cookies de la sesión de Mercado Público guardadas por Playwright
+SESSION_STATE_FILE = Path("session.json")
+
+# número de licitaciones que se extraen a la vez
+SCRAPE_CONCURRENCY = 8
+
+# páginas del navegador que se usan a la vez al extraer con Playwright
+BROWSER_MAX_PAGES = 4
+
+# segundos que puede tardar la extracción de una licitación con el navegador,
+# y cuántas veces se reintenta si falla o se pasa de ese tiempo
+BROWSER_CRAWL_TIMEOUT = 120
+BROWSER_CRAWL_RETRIES = 2
+
+# modales de proveedores que se recuerdan para no volver a pedirlos
+MODAL_CACHE_SIZE = 4096
+# valores ya validados (RUT, correos, teléfonos, nombres) que se recuerdan
+VALIDATOR_CACHE_SIZE = 8192
+
+# número de licitaciones que se ingresan a la base de datos por commit
+PARSE_BATCH_SIZE = 500
+
+# licitaciones extraídas que se guardan e ingresan juntas mientras se sigue
+# extrayendo, y cuántas pueden esperar en cola antes de frenar la extracción
+INGEST_BATCH_SIZE = 100
+INGEST_QUEUE_SIZE = 200
+
+# hilos usados para leer los archivos locales de licitaciones
+LOAD_FILES_WORKERS = 32
+
+
+def ensure_dirs():
+    """Crea las carpetas de trabajo del programa, si no existen."""
+    DUMP_DIR.mkdir(exist_ok=True)
+    WORK_DIR.mkdir(exist_ok=True)
+
+
+def configure_logging():
+    """Agrega el archivo de log a los destinos del logger."""
+    logger.add(sink=LOG_FILE)
@@ -1,18 +1,37 @@
 from __future__ import annotations
 
+import asyncio
+import atexit
+import collections
+import contextlib
+import contextvars
+import dataclasses
 import enum
+import functools
+import io
 import os
 import re
+import shutil
+import tempfile
 from datetime import date, datetime
 from pathlib import Path
-from typing import Generic, Literal, NamedTuple, TypeVar
+from typing import BinaryIO, Generic, Literal, NamedTuple, TypeVar
+from urllib.parse import urljoin
 
 from loguru import logger
-
-from mpscraper.const import DUMP_DIR
+import orjson
+
+from mpscraper.const import (
+    BROWSER_CRAWL_RETRIES,
+    BROWSER_CRAWL_TIMEOUT,
+    BROWSER_MAX_PAGES,
+    DUMP_DIR,
+    MODAL_CACHE_SIZE,
+    SESSION_STATE_FILE,
+)
 from mpscraper.models import BidStatus
 
-F = TypeVar("F", str, bytes)
+F = TypeVar("F", str, bytes, BinaryIO, Path)
 
 
 class VirtualFile(NamedTuple, Generic[F]):
@@ -20,16 +39,17 @@ class VirtualFile(NamedTuple, Generic[F]):
     content: F
 
 
-AgilResultsCrawlContent = VirtualFile[str]
+AgilResultsCrawlContent = VirtualFile[BinaryIO]
 
 
-class AgilCrawlContents(NamedTuple):
-    main: str  # html
-    modals: list[str]  # json
-    modal_selected: str | None  # json
-    provider_listing: VirtualFile[str] | None  # xls/html
-    bo_pdf: VirtualFile[bytes] | None  # pdf
-    bo_screen: str | None  # html
+@dataclasses.dataclass(slots=True, frozen=True)
+class AgilCrawlContents:
+    main: bytes  # html
+    modals: list[bytes]  # json
+    modal_selected: bytes | None  # json
+    provider_listing: VirtualFile[bytes] | None  # xls/html
+    bo_pdf: VirtualFile[bytes] | VirtualFile[Path] | None  # pdf
+    bo_screen: bytes | None  # html
 
 
 class Credentials(NamedTuple):
@@ -37,36 +57,248 @@ class Credentials(NamedTuple):
     password: str
 
 
+ONCLICK_LOCATION_PREFIX = "window.location='"
+
+
+def location_from_onclick(onclick: str) -> str | None:
+    """Saca la URL de un ``onclick`` de la forma ``window.location='...';``.
+
+    Si el ``onclick`` no tiene esa forma, no retorna nada."""
+    if not onclick.startswith(ONCLICK_LOCATION_PREFIX):
+        return None
+    rest = onclick[len(ONCLICK_LOCATION_PREFIX) :]
+    if "\\" not in rest:
+        return rest.split("'", 1)[0]
+    # la URL trae comillas o barras escapadas; se lee hasta la primera
+    # comilla sin escapar
+    chars = []
+    it = iter(rest)
+    for char in it:
+        if char == "'":
+            break
+        chars.append(next(it, "") if char == "\\" else char)
+    return "".join(chars)
+
+
+FILENAME_RE = re.compile(r'filename="?(?P<filename>[^";]+)"?')
+
+
+def attachment_filename(disposition: str) -> str | None:
+    """Saca el nombre de archivo de un encabezado ``Content-Disposition``,
+    sin las carpetas que pueda traer, para que no se pueda escribir fuera de
+    la carpeta donde se guarda.
+
+    Si no hay un nombre o no es válido, no retorna nada."""
+    match = FILENAME_RE.search(disposition)
+    if not match:
+        return None
+    filename = os.path.basename(match["filename"].strip().replace("\\", "/"))
+    if filename in ("", ".", ".."):
+        return None
+    return filename
+
+
+@functools.cache
+def downloads_dir() -> Path:
+    """Carpeta temporal donde quedan las descargas del navegador hasta que se
+    guardan; se borra al terminar el programa."""
+    path = Path(tempfile.mkdtemp(prefix="mpscraper-"))
+    atexit.register(shutil.rmtree, path, ignore_errors=True)
+    return path
+
+
+def html_bytes(html: str) -> bytes:
+    """Codifica una sola vez el HTML entregado por el navegador.
+
+    El DOM puede traer surrogates sueltos (por ejemplo, texto cortado por
+    JS), que no se pueden codificar en UTF-8; se reemplazan en vez de fallar."""
+    return html.encode("utf-8", "replace")
+
+
+@functools.cache
+def compiled_xpath(expression: str):
+    """Compila una expresión XPath una sola vez y la reutiliza."""
+    import lxml.etree
+
+    return lxml.etree.XPath(expression)
+
+
+def modal_cache(maxsize: int = MODAL_CACHE_SIZE):
+    """Decora un ``_fetch_modal`` para guardar los últimos ``maxsize`` modales
+    obtenidos y no volver a pedirlos durante la ejecución. Solo se guardan
+    las respuestas exitosas."""
+
+    def decorator(fetch_modal):
+        cache: collections.OrderedDict[
+            tuple[int, int], bytes
+        ] = collections.OrderedDict()
+
+        @functools.wraps(fetch_modal)
+        async def wrapper(self, id_solicitud: int, id_cotizacion: int):
+            key = (id_solicitud, id_cotizacion)
+            if (content := cache.get(key)) is not None:
+                cache.move_to_end(key)
+                return content
+            content = await fetch_modal(self, id_solicitud, id_cotizacion)
+            if content is not None:
+                cache[key] = content
+                if len(cache) > maxsize:
+                    cache.popitem(last=False)
+            return content
+
+        return wrapper
+
+    return decorator
+
+
+async def gather_modals(fetch_modal, id_solicitud: int, ids_cotizacion: list[int]):
+    """Pide en paralelo los modales de varias cotizaciones con ``fetch_modal``.
+
+    Entrega el contenido de cada modal en el mismo orden de las ids, o
+    ``None`` para los que no se pudieron obtener."""
+    results = await asyncio.gather(
+        *(fetch_modal(id_solicitud, id_cotizacion) for id_cotizacion in ids_cotizacion),
+        return_exceptions=True,
+    )
+    contents = []
+    for id_cotizacion, result in zip(ids_cotizacion, results):
+        if isinstance(result, BaseException):
+            logger.warning(f"Error al obtener modal {id_cotizacion!r}: {result!r}")
+            result = None
+        contents.append(result)
+    return contents
+
+
 class MerPubSection(enum.Enum):
     AGIL = 1
 
 
-class Crawler:
-    """Base para un Crawler con Playwright."""
+# Valores de las opciones del select "Estado" en la búsqueda ágil
+STATUS_TO_DDL: dict[Literal["*"] | BidStatus, int] = {
+    "*": 0,
+    BidStatus.PUBLISHED: 2,
+    BidStatus.CLOSED: 3,
+    BidStatus.BO_EMITTED: 4,
+    BidStatus.CANCELLED: 5,
+}
 
-    def __init__(self):
-        from playwright.sync_api import sync_playwright
 
-        logger.debug("Iniciando Playwright con Chromium")
-        self.playwright = sync_playwright().start()
-        self.browser = self.playwright.chromium.launch()
-        self.context = self.browser.new_context()
-        self.page = self.context.new_page()
+class SharedBrowser:
+    """Playwright con un Chromium que comparten un crawler y sus pestañas.
+    Se inicia la primera vez que se pide y lo cierra quien lo creó."""
 
-    def __del__(self):
-        self.context.close()
-        self.browser.close()
-        self.playwright.stop()
+    def __init__(self):
+        self._lock = asyncio.Lock()
+        self.playwright = None
+        self.browser = None
+
+    async def get(self):
+        """Entrega Playwright y el navegador, iniciándolos la primera vez."""
+        async with self._lock:
+            if self.browser is None:
+                from playwright.async_api import async_playwright
+
+                logger.debug("Iniciando Playwright con Chromium")
+                self.playwright = await async_playwright().start()
+                self.browser = await self.playwright.chromium.launch()
+            return self.playwright, self.browser
+
+    async def aclose(self):
+        """Cierra el navegador, si es que se llegó a iniciar."""
+        async with self._lock:
+            if self.browser is None:
+                return
+            try:
+                await self.browser.close()
+                await self.playwright.stop()  # type: ignore
+            except Exception as err:
+                logger.debug(f"Error al cerrar Playwright: {err!r}")
+            self.playwright = self.browser = None
 
-    def save_dump(self, dir: str | os.PathLike = DUMP_DIR):
-        dir = Path(dir)
+
+class Crawler:
+    """Base para un Crawler con Playwright.
+
+    El navegador se comparte con los crawlers que reciben el mismo
+    ``SharedBrowser``; si no se entrega uno, el crawler levanta el suyo y lo
+    cierra al terminar. Cada crawler abre su propio contexto, que parte con la sesión guardada en
+    ``SESSION_STATE_FILE`` si existe, para no tener que volver a iniciar
+    sesión con Clave Única. Como la API de Playwright es asíncrona, el
+    crawler se usa con ``async with``."""
+
+    # recursos que el crawler nunca usa y que no se descargan
+    BLOCKED_RESOURCE_TYPES = frozenset({"image", "font", "media"})
+
+    def __init__(self, browser: SharedBrowser | None = None):
+        self._owns_browser = browser is None
+        self.shared_browser = browser or SharedBrowser()
+        self.context = None
+        self.dump_enabled = os.environ.get("MPSCRAPER_DUMP") == "1"
+        self._dump_tasks: set[asyncio.Task] = set()
+
+    async def start(self):
+        self.playwright, self.browser = await self.shared_browser.get()
+        self.context = await self.browser.new_context(
+            storage_state=SESSION_STATE_FILE if SESSION_STATE_FILE.exists() else None
+        )
+        await self.context.route("**/*", self._block_resources)
+        self.page = await self.context.new_page()
+        # peticiones HTTP que comparten las cookies y conexiones del contexto
+        self.session = self.context.request
+        return self
+
+    async def aclose(self):
+        if self._dump_tasks:
+            await asyncio.gather(*self._dump_tasks)
+        if self.context is not None:
+            await self.context.close()
+            self.context = None
+        if self._owns_browser:
+            await self.shared_browser.aclose()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def _block_resources(self, route):
+        if route.request.resource_type in self.BLOCKED_RESOURCE_TYPES:
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def save_session(self):
+        """Guarda las cookies de la sesión para reutilizarlas al volver a
+        iniciar el programa."""
+        logger.debug(f"Guardando sesión en {str(SESSION_STATE_FILE)!r}")
+        await self.context.storage_state(path=SESSION_STATE_FILE)
+
+    def save_dump(self, dir: str | os.PathLike = DUMP_DIR, *, full_page=False):
+        """Guarda una captura y el HTML de la página para depurar.
+
+        Solo se guarda si la variable de entorno ``MPSCRAPER_DUMP`` es ``1``,
+        y se hace en segundo plano para no detener al crawler."""
+        if not self.dump_enabled:
+            return
+        task = asyncio.create_task(self._dump(Path(dir), full_page))
+        self._dump_tasks.add(task)
+        task.add_done_callback(self._dump_tasks.discard)
+
+    async def _dump(self, dir: Path, full_page: bool):
         now = int(datetime.now().timestamp())
         now = str(now)
         scr_path = dir / (now + ".png")
         html_path = dir / (now + ".html")
         logger.debug(f"Guardando volcados como: {scr_path!r} y {html_path!r}")
-        scr_path.write_bytes(self.page.screenshot(full_page=True))
-        html_path.write_text(self.page.content(), "utf-8")
+        try:
+            html = html_bytes(await self.page.content())
+            screenshot = await self.page.screenshot(full_page=full_page)
+        except Exception as err:
+            logger.debug(f"No se pudo guardar el volcado: {err!r}")
+            return
+        html_path.write_bytes(html)
+        scr_path.write_bytes(screenshot)
 
 
 class MerPubCrawler(Crawler):
@@ -78,16 +310,75 @@ class MerPubCrawler(Crawler):
     )
     BUSQUEDA_AGIL_URL = BUSQUEDA_AGIL_URL_PREFIX + "BuscarCotizacion.aspx"
     VER_DETALLE_RE = re.compile("Ver detalle|Participa")
-    VER_DETALLE_ONCLICK_RE = re.compile(
-        r"^window\.location='(?P<url>(?:[^'\\]|\\.)*)';.*$"
-    )
+    # formato de las fechas tal como quedan escritas en los campos de búsqueda
+    DATE_INPUT_FORMAT = r"%d-%m-%Y"
     AJAX_MODAL_INFO_URL = "https://www.mercadopublico.cl/CompraAgil/Modules/Cotizacion/SeleccionProveedor.aspx/ObtenerDatosCotizacion"
-
-    def __init__(self, credentials: Credentials):
-        super().__init__()
+    AJAX_HEADERS = {
+        "accept": "application/json, text/javascript, */*; q=0.01",
+        "content-type": "application/json; charset=UTF-8",
+        "x-requested-with": "XMLHttpRequest",
+    }
+    # Quita el modal de explicación ("stepper") y su fondo oscuro
+    MODAL_DISMISSER_JS = """() => {
+        const dismiss = () => {
+            const modal = document.querySelector("#modalStepper");
+            if (!modal) return false;
+            modal.remove();
+            document.querySelector(".modal-backdrop")?.remove();
+            document.body.classList.remove("modal-open");
+            return true;
+        };
+        if (dismiss()) return true;
+        const observer = new MutationObserver(() => {
+            if (dismiss()) observer.disconnect();
+        });
+        observer.observe(document, { childList: true, subtree: true });
+        return false;
+    }"""
+    # Obtiene en una sola llamada al navegador las ids para pedir los modales
+    MODAL_IDS_JS = """() => {
+        const hidden = document.querySelector("#hdnIdSolicitud");
+        const ids = (selector) => Array.from(
+            document.querySelectorAll(selector + " button[data-qs2]"),
+            (button) => button.textContent.includes("Ver detalle")
+                ? button.getAttribute("data-qs2") : null,
+        ).filter(Boolean);
+        return {
+            hidden: hidden ? hidden.value : null,
+            providers: ids("#GvProvider"),
+            selected: ids("#gvSeleccionado"),
+        };
+    }"""
+
+    def __init__(
+        self,
+        credentials: Credentials,
+        max_pages: int = BROWSER_MAX_PAGES,
+        *,
+        _pages: asyncio.Semaphore | None = None,
+        _browser: SharedBrowser | None = None,
+    ):
+        super().__init__(_browser)
         self.credentials = credentials
-
-    def login_merpub(self):
+        self._frame = None
+        self._frame_locator = None
+        # limita los contextos abiertos a la vez entre este crawler y sus pestañas
+        self._pages = _pages or asyncio.Semaphore(max_pages)
+
+    @contextlib.asynccontextmanager
+    async def tab(self):
+        """Abre otro crawler con su propio contexto en el mismo navegador, para
+        extraer varias licitaciones en paralelo sin levantar otro navegador.
+        El contexto nuevo reutiliza la sesión ya guardada.
+
+        Espera si ya hay ``max_pages`` páginas trabajando."""
+        async with self._pages:
+            async with MerPubCrawler(
+                self.credentials, _pages=self._pages, _browser=self.shared_browser
+            ) as tab:
+                yield tab
+
+    async def login_merpub(self):
         """Intenta iniciar sesión en Mercado Público con las credenciales
         del crawler.
 
@@ -98,94 +389,140 @@ class MerPubCrawler(Crawler):
         logger.info("Iniciando sesión en Mercado Público")
         p = self.page
 
-        def main_process():
-            p.goto(self.HOME_URL)
+        async def main_process():
+            await p.goto(self.HOME_URL)
 
-            p.get_by_role("button", name="Iniciar Sesión").click()
-            p.get_by_role("link", name="ClaveÚnica").click()
+            await p.get_by_role("button", name="Iniciar Sesión").click()
+            await p.get_by_role("link", name="ClaveÚnica").click()
 
             # si se ha iniciado sesión previamente, puede que se
             # salte la parte de inicio de sesión con Clave Única
             if p.url.startswith("https://accounts.claveunica.gob.cl/"):
                 logger.debug("Iniciando sesión con Clave Única")
-                p.wait_for_load_state()
-                p.locator("#uname").type(self.credentials.username)  # Ingresa tu RUN
-                p.locator("#pword").type(self.credentials.password)  # Ingresa tu Clave
-                p.get_by_role("button", name="Continuar").click()
+                await p.wait_for_load_state()
+                # Ingresa tu RUN
+                await p.locator("#uname").type(self.credentials.username)
+                # Ingresa tu Clave
+                await p.locator("#pword").type(self.credentials.password)
+                await p.get_by_role("button", name="Continuar").click()
             else:
                 logger.debug("Sesión previamente iniciada; saltando Clave Única")
 
         while True:
-            main_process()
-            p.wait_for_load_state()
-            if p.query_selector(".swal2-container"):
-                raise Exception("La cuenta aparece como bloqueada")
+            await main_process()
+            # se espera a lo primero que aparezca, la lista de organismos o el
+            # aviso de cuenta bloqueada, en vez de esperar a que cargue todo
             try:
-                if p.wait_for_selector(".rdbOrganismo", timeout=2500):
-                    break
+                await p.locator(".rdbOrganismo, .swal2-container").first.wait_for(
+                    timeout=10000
+                )
             except TimeoutError:
                 logger.warning(
                     "Lista de organismos no mostrada al iniciar sesión; reintentando"
                 )
-                pass
+                continue
+            if await p.locator(".swal2-container").count():
+                raise Exception("La cuenta aparece como bloqueada")
+            break
 
         # check for '#kc-error-message'
 
-        p.click(".rdbOrganismo")  # primer organismo en lista
-        p.get_by_role("link", name="Ingresar").click()
+        await p.click(".rdbOrganismo")  # primer organismo en lista
+        await p.get_by_role("link", name="Ingresar").click()
+        await p.wait_for_load_state()
+        await self.save_session()
         logger.success("Sesión iniciada en Mercado Público")
 
     @property
     def f(self):
-        """El frame donde se navega dentro del portal."""
-        f = self.page.frame(self.MAIN_FRAME_NAME)
-        if not f:
-            raise Exception("No se encontró el frame principal")
-        return f
+        """El frame donde se navega dentro del portal.
+
+        Se busca una sola vez y se reutiliza mientras siga en la página; si
+        el portal se recarga, el frame queda separado y se vuelve a buscar."""
+        if self._frame is None or self._frame.is_detached():
+            self._frame = self.page.frame(self.MAIN_FRAME_NAME)
+            if not self._frame:
+                raise Exception("No se encontró el frame principal")
+        return self._frame
 
     @property
     def fl(self):
         """Un FrameLocator del frame donde se navega dentro del portal."""
-        return self.page.frame_locator("#" + self.MAIN_FRAME_NAME)
-
-    def inject_instructions_modal_dismisser(self):
-        """Inyecta un script en la página del portal que trata de quitar
-        el modal de explicación cada 500 ms en el frame correspondiente."""
+        if self._frame_locator is None:
+            self._frame_locator = self.page.frame_locator("#" + self.MAIN_FRAME_NAME)
+        return self._frame_locator
+
+    async def _download_postback(self, target: str) -> tuple[str, bytes]:
+        """Descarga el archivo que entrega el postback de un control del frame
+        y entrega su nombre y contenido.
+
+        En vez de hacer click y esperar la descarga del navegador, envía el
+        formulario de ASP.NET (``__VIEWSTATE``, ``__EVENTVALIDATION``, etc)
+        directamente, con las cookies del contexto."""
+        import lxml.html
+
+        tree = lxml.html.fromstring(await self.f.content(), base_url=self.f.url)
+        form = tree.forms[0]
+        data = dict(form.form_values())
+        data["__EVENTTARGET"] = target
+        data["__EVENTARGUMENT"] = ""
+        response = await self.session.post(form.action or self.f.url, form=data)
+        disposition = response.headers.get("content-disposition", "")
+        if not response.ok or not (filename := attachment_filename(disposition)):
+            raise Exception(f"El postback de {target!r} no entregó un archivo")
+        return filename, await response.body()
+
+    async def download_postback(self, target: str) -> VirtualFile[bytes]:
+        """Descarga el archivo que entrega el postback de un control del frame."""
+        return VirtualFile(*await self._download_postback(target))
+
+    async def download_postback_stream(self, target: str) -> VirtualFile[BinaryIO]:
+        """Descarga el archivo que entrega el postback de un control del frame,
+        entregándolo como un archivo en memoria."""
+        filename, content = await self._download_postback(target)
+        return VirtualFile(filename, io.BytesIO(content))
+
+    async def inject_instructions_modal_dismisser(self):
+        """Quita el modal de explicación del frame del portal con una sola
+        llamada al navegador: si ya está, lo quita de inmediato y, si no,
+        deja un observador que lo quita apenas aparezca."""
 
         logger.debug("Injectando JS para ignorar modal de explicación en búsqueda ágil")
-        self.page.wait_for_load_state()
-        self.f.wait_for_load_state()
-        self.f.evaluate(
-            "setInterval(function () {"
-            "    document.getElementById('fraDetalle')"
-            "        .contentWindow.$('#modalStepper').modal('hide');"
-            "}, 500);"
-        )
-        # self.f.evaluate("$('#modalStepper').modal('hide');")
+        await self.f.evaluate(self.MODAL_DISMISSER_JS)
 
-    def visit_merpub_section(self, section: MerPubSection):
+    async def visit_merpub_section(self, section: MerPubSection):
         """Visita una sección de mercado público.
 
         Requiere tener la sesión iniciada, por lo que intenta iniciar
         sesión si no se encuentra con la sesión iniciada."""
         p = self.page
         if p.url != self.PORTAL_URL:
-            p.goto(self.PORTAL_URL)
+            self._frame = None
+            await p.goto(self.PORTAL_URL)
             # p.wait_for_load_state()
             if p.url == self.HOME_URL:
-                self.login_merpub()
-                self.page.wait_for_load_state()
-            self.inject_instructions_modal_dismisser()
+                await self.login_merpub()
+                await self.page.wait_for_load_state()
+            await self.inject_instructions_modal_dismisser()
 
         logger.debug(f"Visitando portal de {section!r}")
         match section:
             case MerPubSection.AGIL:
                 if self.f.url != self.BUSQUEDA_AGIL_URL:
-                    self.fl.get_by_role("link", name="COMPRA ÁGIL").click()
-                    p.wait_for_load_state()
-        p.wait_for_load_state()
-
-    def crawl_results_from_agil_params(
+                    await self.fl.get_by_role("link", name="COMPRA ÁGIL").click()
+                    await p.wait_for_load_state()
+                    # el frame cargó otro documento, que puede volver a
+                    # mostrar el modal
+                    await self.inject_instructions_modal_dismisser()
+        await p.wait_for_load_state()
+
+    @staticmethod
+    def ddl_state_value(status: Literal["*"] | BidStatus) -> int:
+        """Valor de la opción del select "Estado" en la búsqueda ágil."""
+        # cualquier otro estado se busca como "Todos"
+        return STATUS_TO_DDL.get(status, 0)
+
+    async def crawl_results_from_agil_params(
         self,
         *,
         date_from: date,
@@ -195,125 +532,126 @@ class MerPubCrawler(Crawler):
         """Realiza una búsqueda en licitaciones ágiles y entrega la lista de resultados.
 
         Si no se encuentra ningún resultado, no retorna nada."""
-        self.visit_merpub_section(MerPubSection.AGIL)
+        await self.visit_merpub_section(MerPubSection.AGIL)
 
         logger.debug(
             f"Configurando búsqueda ágil: categoría={status!r}, desde={date_from!r}, hasta={date_until!r}"
         )
-        self.fl.get_by_text("Solamente cotizaciones de mis rubros").click()
-
-        val = 0
-        match status:
-            case "*":
-                val = 0
-            case BidStatus.PUBLISHED:
-                val = 2
-            case BidStatus.CLOSED:
-                val = 3
-            case BidStatus.BO_EMITTED:
-                val = 4
-            case BidStatus.CANCELLED:
-                val = 5
+        await self.fl.get_by_text("Solamente cotizaciones de mis rubros").click()
+
+        val = self.ddl_state_value(status)
         ddl_lo = self.fl.locator("#ddlState")  # "Estado"
-        ddl_lo.select_option(str(val))
-        ddl_lo.focus()
-        self.page.keyboard.down("Tab")
+        await ddl_lo.select_option(str(val))
+        await ddl_lo.focus()
+        await self.page.keyboard.down("Tab")
 
-        df_lo = self.fl.locator("#fdesde")
-        df_lo.type(date_from.strftime("%d%m%Y"), delay=50)  # "Fecha Desde:"
-        self.page.keyboard.down("Tab")
+        # se escribe el valor completo de una vez en vez de tecla por tecla
+        df_lo = self.fl.locator("#fdesde")  # "Fecha Desde:"
+        await df_lo.fill(date_from.strftime(self.DATE_INPUT_FORMAT))
+        await self.page.keyboard.down("Tab")
 
-        dt_lo = self.fl.locator("#fhasta")
-        dt_lo.type(date_until.strftime("%d%m%Y"), delay=50)  # "Fecha Hasta:"
-        self.page.keyboard.down("Tab")
+        dt_lo = self.fl.locator("#fhasta")  # "Fecha Hasta:"
+        await dt_lo.fill(date_until.strftime(self.DATE_INPUT_FORMAT))
+        await self.page.keyboard.down("Tab")
 
-        self.fl.locator("#btnSearchParameter").click()  # "Buscar"
+        await self.fl.locator("#btnSearchParameter").click()  # "Buscar"
 
         self.save_dump()
 
         lo = self.fl.locator("#lnkDownloadExcel")  # "Descargar resultados en excel"
-        if lo.count():
+        if await lo.count():
             logger.debug("Descargando lista de resultados")
             # self.ignore_instructions_modal()
-            with self.page.expect_download() as download_info:
-                self.page.wait_for_timeout(250)
-                self.f.evaluate("__doPostBack('lnkDownloadExcel','');")
-                self.page.wait_for_timeout(250)
-
-            path = download_info.value.path()
-            if not path:
-                raise Exception("La descarga no se terminó")
-            file = path.read_text()
-
-            return VirtualFile(download_info.value.suggested_filename, file)
+            return await self.download_postback_stream("lnkDownloadExcel")
         else:  # No se encontraron resultados
             logger.warning("No se encontró ningún resultado")
             return None
 
-    def crawl_from_agil_idn(self, idn: str) -> AgilCrawlContents | None:
-        """Extrae los contenidos de una licitación buscando a base de su número."""
+    async def crawl_from_agil_idn(
+        self,
+        idn: str,
+        *,
+        timeout: float = BROWSER_CRAWL_TIMEOUT,
+        retries: int = BROWSER_CRAWL_RETRIES,
+    ) -> AgilCrawlContents | None:
+        """Extrae los contenidos de una licitación buscando a base de su número.
+
+        Cada licitación se extrae en su propia pestaña, así que se pueden
+        extraer varias a la vez con ``asyncio.gather``. Cada intento tiene
+        ``timeout`` segundos y, si falla, se reintenta ``retries`` veces en una
+        pestaña nueva, ya que la anterior puede haber quedado en un estado
+        inválido."""
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                async with self.tab() as tab:
+                    return await asyncio.wait_for(
+                        tab._crawl_from_agil_idn(idn), timeout
+                    )
+            except Exception as err:
+                if attempt > retries:
+                    raise
+                logger.warning(
+                    f"Error al extraer licitación {idn!r} (intento {attempt}): {err!r}; reintentando"
+                )
+
+    async def _crawl_from_agil_idn(self, idn: str) -> AgilCrawlContents | None:
         logger.debug(f"Descargando datos de licitación ágil: idn={idn}")
-        self.visit_merpub_section(MerPubSection.AGIL)
+        await self.visit_merpub_section(MerPubSection.AGIL)
 
-        self.fl.locator("#txtIDQuote").fill(idn)  # "Busca Por ID"
+        await self.fl.locator("#txtIDQuote").fill(idn)  # "Busca Por ID"
 
-        self.fl.get_by_role("button", name="Buscar ID").click()
-        self.f.wait_for_load_state()
+        await self.fl.get_by_role("button", name="Buscar ID").click()
+        await self.f.wait_for_load_state()
 
         logger.debug("Tratando de entrar a página de contenido de licitación")
         # "Ver detalle" en resultados
         lo = self.fl.get_by_role("button", name=self.VER_DETALLE_RE)
-        match = self.VER_DETALLE_ONCLICK_RE.match(lo.get_attribute("onclick") or "")
-        if not match:
+        url = location_from_onclick(await lo.get_attribute("onclick") or "")
+        if url is None:
             raise Exception()
-        self.f.goto(self.BUSQUEDA_AGIL_URL_PREFIX + match["url"])
+        await self.f.goto(self.BUSQUEDA_AGIL_URL_PREFIX + url)
 
         if self.f.url == self.BUSQUEDA_AGIL_URL:
             pass
 
         logger.debug(f"En url: {self.f.url!r}")
 
-        html = self.f.content()
+        html = html_bytes(await self.f.content())
 
         # "Descargar listado en excel"
         lo = self.fl.locator("#lnkDownloadExcel")
-        if lo.count():
+        if await lo.count():
             logger.debug("Listado de proveedores encontrado; descargando lista")
-            with self.page.expect_download() as download_info:
-                self.page.wait_for_timeout(500)
-                self.f.evaluate("__doPostBack('lnkDownloadExcel','');")
-                self.page.wait_for_timeout(500)
-            path = download_info.value.path()
-            if not path:
-                raise Exception("La descarga no se terminó")
-            file = path.read_text()
-            provider_listing = VirtualFile(download_info.value.suggested_filename, file)
+            provider_listing = await self.download_postback("lnkDownloadExcel")
         else:
             logger.debug("No se detectó listado de proveedores")
             provider_listing = None
 
         # "Ver orden de compra"
         lo = self.fl.locator("#lnkOrdenCompra:not(.disabled)")
-        if lo.count():
+        if await lo.count():
             logger.debug("Orden de compra detectada; descargando")
-            with self.page.expect_popup() as pu:
-                lo.click()
-            pu = pu.value
-            bo_screen = pu.content()
-
-            with pu.expect_download() as download_info:
-                with pu.expect_popup() as pdf_pu:
+            async with self.page.expect_popup() as pu:
+                await lo.click()
+            pu = await pu.value
+            await pu.wait_for_load_state()
+            bo_screen = html_bytes(await pu.content())
+
+            async with pu.expect_download() as download_info:
+                async with pu.expect_popup() as pdf_pu:
                     logger.debug("Descargando PDF de la orden de compra")
-                    pu.locator("#imgPDF").click()  # "PDF"
-                pdf_pu = pdf_pu.value
-            path = download_info.value.path()
-            if not path:
-                raise Exception("La descarga no se terminó")
-            bo_pdf = VirtualFile(
-                download_info.value.suggested_filename, path.read_bytes()
-            )
-            pdf_pu.close()
-            pu.close()
+                    await pu.locator("#imgPDF").click()  # "PDF"
+                pdf_pu = await pdf_pu.value
+            download = await download_info.value
+            # Playwright borra sus descargas al cerrar el contexto; se mueve
+            # a otra carpeta para leerla recién al guardar los archivos
+            path = downloads_dir() / f"{idn}-{download.suggested_filename}"
+            await download.save_as(path)
+            bo_pdf = VirtualFile(download.suggested_filename, path)
+            await pdf_pu.close()
+            await pu.close()
         else:
             logger.debug("No fue detectada una orden de compra")
             bo_screen = None
@@ -321,53 +659,538 @@ class MerPubCrawler(Crawler):
 
         modal_contents = []
         selected_modal_content = None
-        # Para hacer requests AJAX hay un input oculto que contiene una id que necesitamos
-        hidden_id = self.fl.locator("#hdnIdSolicitud")
-        if hidden_id.count():
-            hidden_id = int(hidden_id.get_attribute("value"))  # type: ignore
-            lo = self.fl.locator("#GvProvider")
-            if lo.count():
+        # Para hacer requests AJAX hay un input oculto que contiene una id que
+        # necesitamos, y cada enlace para ver un modal contiene otra
+        ids = await self.f.evaluate(self.MODAL_IDS_JS)
+        if ids["hidden"]:
+            providers = [int(id_modal) for id_modal in ids["providers"]]
+            selected = [int(id_modal) for id_modal in ids["selected"][:1]]
+            if providers:
                 logger.debug("Descargando modales de proveedores")
-                modal_links = lo.get_by_role("button", name="Ver detalle")
-                if modal_links.count():
-                    for link in modal_links.all():
-                        # El enlace para ver el modal contiene una id que necesitamos
-                        id_modal = link.get_attribute("data-qs2")
-                        if not id_modal:
-                            continue
-                        id_modal = int(id_modal)
-                        response = self.page.request.fetch(
-                            self.AJAX_MODAL_INFO_URL,
-                            headers={
-                                "accept": "application/json, text/javascript, */*; q=0.01",
-                                "content-type": "application/json; charset=UTF-8",
-                                "x-requested-with": "XMLHttpRequest",
-                            },
-                            data={"idSolicitud": hidden_id, "idCotizacion": id_modal},
-                            method="POST",
-                        )
-                        if response.ok:
-                            modal_contents.append(response.text())
-
-            lo = self.fl.locator("#gvSeleccionado")
-            if lo.count():
+            if selected:
                 logger.debug("Hay un proveedor seleccionado; descargando modal")
-                link = lo.get_by_role("button", name="Ver detalle")
-                # El enlace para ver el modal contiene una id que necesitamos
-                id_modal = link.get_attribute("data-qs2")
-                id_modal = int(id_modal)  # type: ignore
-                response = self.page.request.fetch(
-                    self.AJAX_MODAL_INFO_URL,
-                    headers={
-                        "accept": "application/json, text/javascript, */*; q=0.01",
-                        "content-type": "application/json; charset=UTF-8",
-                        "x-requested-with": "XMLHttpRequest",
-                    },
-                    data={"idSolicitud": hidden_id, "idCotizacion": id_modal},
-                    method="POST",
+            contents = await gather_modals(
+                self._fetch_modal, int(ids["hidden"]), providers + selected
+            )
+            if selected:
+                selected_modal_content = contents.pop()
+            modal_contents = [content for content in contents if content]
+
+        logger.success(f"Licitación {idn!r} con sus datos descargados")
+
+        return AgilCrawlContents(
+            html,
+            modal_contents,
+            selected_modal_content,
+            provider_listing,
+            bo_pdf,
+            bo_screen,
+        )
+
+    @modal_cache()
+    async def _fetch_modal(self, id_solicitud: int, id_cotizacion: int) -> bytes | None:
+        """Pide por AJAX el contenido del modal de una cotización."""
+        response = await self.session.post(
+            self.AJAX_MODAL_INFO_URL,
+            headers=self.AJAX_HEADERS,
+            data=orjson.dumps(
+                {"idSolicitud": id_solicitud, "idCotizacion": id_cotizacion}
+            ),
+        )
+        if response.ok:
+            return await response.body()
+        return None
+
+
+class LoginFallbackRequired(Exception):
+    """No se pudo iniciar sesión solamente con peticiones HTTP (por ejemplo,
+    porque Clave Única pidió un CAPTCHA) y hay que usar el navegador."""
+
+
+async def _browser_login_cookies(
+    credentials: Credentials, browser: SharedBrowser
+) -> list[dict]:
+    """Inicia sesión en Mercado Público con Playwright y entrega las cookies
+    de la sesión."""
+    async with MerPubCrawler(credentials=credentials, _browser=browser) as crawler:
+        await crawler.visit_merpub_section(MerPubSection.AGIL)
+        return await crawler.context.cookies()  # type: ignore
+
+
+# última respuesta recibida por cada tarea, para el volcado en caso de error;
+# cada tarea de asyncio tiene su propia copia
+_last_response: contextvars.ContextVar = contextvars.ContextVar(
+    "last_response", default=None
+)
+
+
+class AsyncMerPubCrawler:
+    """Crawler de Mercado Público que hace las peticiones HTTP directamente
+    con httpx y parsea el HTML con lxml, sin levantar un navegador.
+
+    Los formularios del portal son de ASP.NET WebForms, así que cada acción
+    es un postback que reenvía el estado de la página (``__VIEWSTATE``,
+    ``__EVENTVALIDATION``, etc). Solo se usa Playwright para iniciar sesión
+    cuando Clave Única no deja hacerlo por HTTP."""
+
+    HOME_URL = MerPubCrawler.HOME_URL
+    PORTAL_URL = MerPubCrawler.PORTAL_URL
+    BUSQUEDA_AGIL_URL_PREFIX = MerPubCrawler.BUSQUEDA_AGIL_URL_PREFIX
+    BUSQUEDA_AGIL_URL = MerPubCrawler.BUSQUEDA_AGIL_URL
+    # equivalente a VER_DETALLE_RE, evaluado por lxml sobre el árbol
+    VER_DETALLE_XPATH = (
+        "//button[@onclick][contains(., 'Ver detalle') or contains(., 'Participa')]"
+    )
+    AJAX_MODAL_INFO_URL = MerPubCrawler.AJAX_MODAL_INFO_URL
+    AJAX_HEADERS = MerPubCrawler.AJAX_HEADERS
+    POSTBACK_RE = re.compile(
+        r"__doPostBack\('(?P<target>[^']*)','(?P<argument>[^']*)'\)"
+    )
+    POPUP_RE = re.compile(r"window\.open\('(?P<url>[^']*)'")
+    CAPTCHA_XPATH = (
+        "//*[contains(@class, 'g-recaptcha') or contains(@class, 'h-captcha')]"
+    )
+    DATE_INPUT_FORMAT = MerPubCrawler.DATE_INPUT_FORMAT
+
+    def __init__(self, credentials: Credentials):
+        import httpx
+
+        self.credentials = credentials
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_keepalive_connections=20),
+            http2=True,
+            follow_redirects=True,
+            timeout=30,
+        )
+        # evita que varias tareas inicien sesión a la vez al expirar la sesión
+        self._login_lock = asyncio.Lock()
+        # el navegador solo se levanta si hubo que iniciar sesión con él
+        self._browser = SharedBrowser()
+        self.load_session()
+
+    def load_session(self):
+        """Carga las cookies guardadas en ``SESSION_STATE_FILE``, si existe,
+        para no tener que volver a iniciar sesión con Clave Única.
+
+        El archivo tiene el formato de ``storage_state`` de Playwright, así que
+        se comparte con el crawler del navegador."""
+        if not SESSION_STATE_FILE.exists():
+            return
+        try:
+            state = orjson.loads(SESSION_STATE_FILE.read_bytes())
+        except ValueError:
+            logger.warning(f"Sesión guardada en {str(SESSION_STATE_FILE)!r} inválida")
+            return
+        self._set_cookies(state.get("cookies", []))
+
+    def _set_cookies(self, cookies: list[dict]):
+        for cookie in cookies:
+            self.client.cookies.set(
+                cookie["name"],
+                cookie["value"],
+                domain=cookie["domain"],
+                path=cookie["path"],
+            )
+
+    def save_session(self):
+        """Guarda las cookies de la sesión para reutilizarlas al volver a
+        iniciar el programa."""
+        logger.debug(f"Guardando sesión en {str(SESSION_STATE_FILE)!r}")
+        cookies = [
+            {
+                "name": cookie.name,
+                "value": cookie.value,
+                "domain": cookie.domain,
+                "path": cookie.path,
+                "expires": cookie.expires if cookie.expires is not None else -1,
+                "httpOnly": False,
+                "secure": cookie.secure,
+                "sameSite": "Lax",
+            }
+            for cookie in self.client.cookies.jar
+        ]
+        SESSION_STATE_FILE.write_bytes(
+            orjson.dumps({"cookies": cookies, "origins": []})
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.client.aclose()
+        await self._browser.aclose()
+
+    @property
+    def last_response(self) -> httpx.Response | None:
+        """Última respuesta recibida en la tarea actual."""
+        return _last_response.get()
+
+    def save_dump(self, dir: str | os.PathLike = DUMP_DIR):
+        """Guarda la última respuesta recibida en la tarea actual."""
+        if self.last_response is None:
+            return
+        dir = Path(dir)
+        now = str(int(datetime.now().timestamp()))
+        html_path = dir / (now + ".html")
+        logger.debug(f"Guardando volcado como: {html_path!r}")
+        html_path.write_bytes(self.last_response.content)
+
+    async def _request(
+        self, method: str, url: str, *, save_to: Path | None = None, **kwargs
+    ):
+        """Hace una petición. Con ``save_to``, el cuerpo de la respuesta se
+        escribe en ese archivo a medida que llega, sin quedar en memoria."""
+        if save_to is None:
+            response = await self.client.request(method, url, **kwargs)
+            _last_response.set(response)
+        else:
+            # una respuesta así no tiene contenido para el volcado, así que
+            # se deja la anterior
+            async with self.client.stream(method, url, **kwargs) as response:
+                with open(save_to, "wb") as file:
+                    async for chunk in response.aiter_bytes():
+                        file.write(chunk)
+        response.raise_for_status()
+        return response
+
+    @staticmethod
+    def _tree(response):
+        import lxml.html
+
+        return lxml.html.fromstring(response.content, base_url=str(response.url))
+
+    @classmethod
+    def _control_fields(cls, element) -> dict[str, str]:
+        """Campos que envía el navegador al hacer click en un control del
+        formulario: ``__EVENTTARGET``/``__EVENTARGUMENT`` para los enlaces
+        con ``__doPostBack`` o el nombre del botón para los botones submit."""
+        script = (element.get("onclick") or "") + (element.get("href") or "")
+        if match := cls.POSTBACK_RE.search(script):
+            return {
+                "__EVENTTARGET": match["target"],
+                "__EVENTARGUMENT": match["argument"],
+            }
+        name = element.get("name")
+        if not name:
+            return {}
+        if element.get("type") == "image":
+            return {name + ".x": "0", name + ".y": "0"}
+        return {name: element.get("value", "")}
+
+    async def _postback(
+        self,
+        response,
+        fields: dict[str, str | None] | None = None,
+        *,
+        save_to: Path | None = None,
+    ):
+        """Envía el formulario de la página de una respuesta, tal como lo
+        haría el navegador, con los campos reemplazados por ``fields``."""
+        tree = self._tree(response)
+        form = tree.forms[0]
+        data = dict(form.form_values())
+        data.setdefault("__EVENTTARGET", "")
+        data.setdefault("__EVENTARGUMENT", "")
+        data.update(fields or {})
+        # un campo en None es un checkbox desmarcado, que no se envía
+        data = {name: value for name, value in data.items() if value is not None}
+        url = form.action or str(response.url)
+        return await self._request("POST", url, data=data, save_to=save_to)
+
+    async def _click(
+        self,
+        response,
+        element,
+        fields: dict[str, str | None] | None = None,
+        *,
+        save_to: Path | None = None,
+    ):
+        return await self._postback(
+            response,
+            {**(fields or {}), **self._control_fields(element)},
+            save_to=save_to,
+        )
+
+    @classmethod
+    def _name_of(cls, tree, id: str) -> str:
+        """Nombre con el que se envía un campo del formulario según su id."""
+        element = tree.get_element_by_id(id)
+        return element.get("name") or id
+
+    @classmethod
+    def _attachment_filename(cls, response, default: str) -> str:
+        disposition = response.headers.get("content-disposition", "")
+        return attachment_filename(disposition) or default
+
+    async def _open(self, response, element, *, save_to: Path | None = None):
+        """Sigue un enlace que el navegador abriría en una ventana nueva o,
+        si es un postback, lo envía."""
+        script = element.get("onclick") or ""
+        href = element.get("href") or ""
+        if match := self.POPUP_RE.search(script):
+            url = match["url"]
+        elif href and not href.startswith(("#", "javascript:")):
+            url = href
+        else:
+            return await self._click(response, element, save_to=save_to)
+        return await self._request(
+            "GET", urljoin(str(response.url), url), save_to=save_to
+        )
+
+    async def _login_http(self):
+        """Inicia sesión con Clave Única solamente con peticiones HTTP."""
+        response = await self._request("GET", self.HOME_URL)
+        links = self._tree(response).xpath(
+            "//a[contains(normalize-space(.), 'ClaveÚnica')]"
+        )
+        if not links:
+            raise LoginFallbackRequired("No se encontró el enlace de Clave Única")
+        response = await self._open(response, links[0])
+
+        # si se ha iniciado sesión previamente, puede que se
+        # salte la parte de inicio de sesión con Clave Única
+        if response.url.host == "accounts.claveunica.gob.cl":
+            logger.debug("Iniciando sesión con Clave Única")
+            tree = self._tree(response)
+            if tree.xpath(self.CAPTCHA_XPATH):
+                raise LoginFallbackRequired("Clave Única pidió un CAPTCHA")
+            form = tree.xpath("//form[.//*[@id='uname']]")
+            if not form:
+                raise LoginFallbackRequired("No se encontró el formulario de login")
+            form = form[0]
+            data = dict(form.form_values())
+            data[self._name_of(tree, "uname")] = self.credentials.username
+            data[self._name_of(tree, "pword")] = self.credentials.password
+            url = form.action or str(response.url)
+            response = await self._request("POST", url, data=data)
+        else:
+            logger.debug("Sesión previamente iniciada; saltando Clave Única")
+
+        tree = self._tree(response)
+        if tree.xpath("//*[contains(@class, 'swal2-container')]"):
+            raise Exception("La cuenta aparece como bloqueada")
+        organismos = tree.xpath(
+            "//input[contains(@class, 'rdbOrganismo')]"
+            " | //*[contains(@class, 'rdbOrganismo')]//input"
+        )
+        ingresar = tree.xpath("//a[normalize-space(.)='Ingresar']")
+        if not organismos or not ingresar:
+            raise LoginFallbackRequired("No se mostró la lista de organismos")
+        organismo = organismos[0]  # primer organismo en lista
+        await self._click(
+            response, ingresar[0], {organismo.get("name"): organismo.get("value")}
+        )
+
+    async def login_merpub(self):
+        """Inicia sesión en Mercado Público con las credenciales del crawler.
+
+        Si no se puede por HTTP, inicia sesión con Playwright y copia las
+        cookies de la sesión."""
+        import httpx
+
+        logger.info("Iniciando sesión en Mercado Público")
+        try:
+            try:
+                await self._login_http()
+            except httpx.HTTPError as err:
+                # errores HTTP, redirecciones infinitas, etc., en el flujo de
+                # Clave Única; el navegador puede que sí lo logre
+                raise LoginFallbackRequired(
+                    f"Error HTTP al iniciar sesión: {err!r}"
+                ) from err
+        except LoginFallbackRequired as err:
+            logger.warning(f"{err}; iniciando sesión con el navegador")
+            self._set_cookies(
+                await _browser_login_cookies(self.credentials, self._browser)
+            )
+        self.save_session()
+        logger.success("Sesión iniciada en Mercado Público")
+
+    async def visit_busqueda_agil(self):
+        """Visita la búsqueda de licitaciones ágiles, iniciando sesión si es
+        necesario."""
+        response = await self._request("GET", self.BUSQUEDA_AGIL_URL)
+        if str(response.url) == self.BUSQUEDA_AGIL_URL:
+            return response
+        async with self._login_lock:
+            # otra tarea pudo haber iniciado sesión mientras se esperaba
+            response = await self._request("GET", self.BUSQUEDA_AGIL_URL)
+            if str(response.url) != self.BUSQUEDA_AGIL_URL:
+                await self.login_merpub()
+                response = await self._request("GET", self.BUSQUEDA_AGIL_URL)
+                if str(response.url) != self.BUSQUEDA_AGIL_URL:
+                    raise Exception("No se pudo entrar a la búsqueda ágil")
+        return response
+
+    async def _download_excel(self, response, tree, *, save_to: Path | None = None):
+        """Descarga el excel de "lnkDownloadExcel", si es que está en la
+        página, y entrega la respuesta."""
+        lo = tree.xpath("//*[@id='lnkDownloadExcel']")
+        if not lo:
+            return None
+        return await self._click(response, lo[0], save_to=save_to)
+
+    async def crawl_results_from_agil_params(
+        self,
+        *,
+        date_from: date,
+        date_until: date,
+        status: Literal["*"] | BidStatus = "*",
+    ) -> AgilResultsCrawlContent | None:
+        """Realiza una búsqueda en licitaciones ágiles y entrega la lista de resultados.
+
+        Si no se encuentra ningún resultado, no retorna nada."""
+        response = await self.visit_busqueda_agil()
+        tree = self._tree(response)
+
+        logger.debug(
+            f"Configurando búsqueda ágil: categoría={status!r}, desde={date_from!r}, hasta={date_until!r}"
+        )
+        fields: dict[str, str | None] = {
+            self._name_of(tree, "ddlState"): str(  # "Estado"
+                MerPubCrawler.ddl_state_value(status)
+            ),
+            self._name_of(tree, "fdesde"): date_from.strftime(  # "Fecha Desde:"
+                self.DATE_INPUT_FORMAT
+            ),
+            self._name_of(tree, "fhasta"): date_until.strftime(  # "Fecha Hasta:"
+                self.DATE_INPUT_FORMAT
+            ),
+        }
+        # "Solamente cotizaciones de mis rubros" se desmarca
+        data = dict(tree.forms[0].form_values())
+        for id in tree.xpath(
+            "//label[contains(., 'Solamente cotizaciones de mis rubros')]/@for"
+        ):
+            name = self._name_of(tree, id)
+            if name in data:
+                fields[name] = None
+            else:
+                fields[name] = tree.get_element_by_id(id).get("value", "on")
+
+        button = tree.get_element_by_id("btnSearchParameter")  # "Buscar"
+        response = await self._click(response, button, fields)
+
+        # "Descargar resultados en excel"
+        logger.debug("Descargando lista de resultados")
+        # la lista puede ser grande; se descarga directo al disco y se lee de ahí
+        fd, path = tempfile.mkstemp(suffix=".xls", dir=downloads_dir())
+        os.close(fd)
+        path = Path(path)
+        response = await self._download_excel(
+            response, self._tree(response), save_to=path
+        )
+        if not response:  # No se encontraron resultados
+            logger.warning("No se encontró ningún resultado")
+            path.unlink()
+            return None
+        filename = self._attachment_filename(response, "download.xls")
+        return VirtualFile(filename, path.open("rb"))
+
+    async def crawl_from_agil_idn(self, idn: str) -> AgilCrawlContents | None:
+        """Extrae los contenidos de una licitación buscando a base de su número."""
+        logger.debug(f"Descargando datos de licitación ágil: idn={idn}")
+        response = await self.visit_busqueda_agil()
+        tree = self._tree(response)
+
+        button = tree.xpath(
+            "//*[(self::button or self::input or self::a)"
+            " and (normalize-space(.)='Buscar ID' or @value='Buscar ID')]"
+        )
+        if not button:
+            raise Exception("No se encontró el botón para buscar por ID")
+        response = await self._click(
+            response, button[0], {self._name_of(tree, "txtIDQuote"): idn}
+        )
+
+        logger.debug("Tratando de entrar a página de contenido de licitación")
+        # "Ver detalle" en resultados
+        lo = compiled_xpath(self.VER_DETALLE_XPATH)(self._tree(response))
+        url = location_from_onclick(lo[0].get("onclick")) if lo else None
+        if url is None:
+            raise Exception()
+        response = await self._request(
+            "GET", urljoin(self.BUSQUEDA_AGIL_URL_PREFIX, url)
+        )
+        logger.debug(f"En url: {str(response.url)!r}")
+
+        html = response.content
+        tree = self._tree(response)
+        detail_response = response
+
+        # "Descargar listado en excel"
+        response = await self._download_excel(detail_response, tree)
+        if response:
+            logger.debug("Listado de proveedores encontrado; descargado")
+            # con este nombre se reconoce el listado al cargar la carpeta
+            filename = self._attachment_filename(
+                response, f"ProveedoresCotizacionCAgil_{idn}.xls"
+            )
+            provider_listing = VirtualFile(filename, response.content)
+        else:
+            logger.debug("No se detectó listado de proveedores")
+            provider_listing = None
+
+        # "Ver orden de compra"
+        lo = tree.xpath(
+            "//*[@id='lnkOrdenCompra']"
+            "[not(contains(concat(' ', normalize-space(@class), ' '), ' disabled '))]"
+        )
+        bo_screen = None
+        bo_pdf = None
+        if lo:
+            logger.debug("Orden de compra detectada; descargando")
+            response = await self._open(detail_response, lo[0])
+            bo_screen = response.content
+            pdf_lo = self._tree(response).xpath("//*[@id='imgPDF']")  # "PDF"
+            if pdf_lo:
+                logger.debug("Descargando PDF de la orden de compra")
+                path = downloads_dir() / f"{idn}-oc.pdf"
+                response = await self._open(response, pdf_lo[0], save_to=path)
+                if response.headers.get("content-type", "").startswith(
+                    "application/pdf"
+                ):
+                    filename = self._attachment_filename(response, "oc.pdf")
+                    bo_pdf = VirtualFile(filename, path)
+                else:
+                    path.unlink()
+                    logger.warning("No se pudo descargar el PDF de la orden de compra")
+        else:
+            logger.debug("No fue detectada una orden de compra")
+
+        modal_contents = []
+        selected_modal_content = None
+        # Para hacer requests AJAX hay un input oculto que contiene una id que necesitamos
+        hidden_id = tree.xpath("//*[@id='hdnIdSolicitud']/@value")
+        if hidden_id:
+            # El enlace para ver el modal contiene una id que necesitamos
+            providers = [
+                int(id_modal)
+                for id_modal in tree.xpath(
+                    "//*[@id='GvProvider']"
+                    "//button[contains(normalize-space(.), 'Ver detalle')]/@data-qs2"
                 )
-                if response.ok:
-                    selected_modal_content = response.text()
+            ]
+            selected = [
+                int(id_modal)
+                for id_modal in tree.xpath(
+                    "//*[@id='gvSeleccionado']"
+                    "//button[contains(normalize-space(.), 'Ver detalle')]/@data-qs2"
+                )[:1]
+            ]
+            if providers:
+                logger.debug("Descargando modales de proveedores")
+            if selected:
+                logger.debug("Hay un proveedor seleccionado; descargando modal")
+            contents = await gather_modals(
+                self._fetch_modal, int(hidden_id[0]), providers + selected
+            )
+            if selected:
+                selected_modal_content = contents.pop()
+            modal_contents = [content for content in contents if content]
 
         logger.success(f"Licitación {idn!r} con sus datos descargados")
 
@@ -379,3 +1202,12 @@ class MerPubCrawler(Crawler):
             bo_pdf,
             bo_screen,
         )
+
+    @modal_cache()
+    async def _fetch_modal(self, id_solicitud: int, id_cotizacion: int) -> bytes | None:
+        response = await self.client.post(
+            self.AJAX_MODAL_INFO_URL,
+            headers=self.AJAX_HEADERS,
+            json={"idSolicitud": id_solicitud, "idCotizacion": id_cotizacion},
+        )
+        return response.content if response.is_success else None
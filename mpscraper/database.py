@@ -1,25 +1,151 @@
-from sqlalchemy import select
+import dataclasses
+from typing import Sequence
+
+from sqlalchemy import Engine, event, make_url
 from sqlalchemy.orm import Session
 
+from mpscraper.const import INSERT_PAGE_SIZE
 from mpscraper.models import *
 from mpscraper.parser import ParseAgilResultModels
 
 
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+)
+
+
+def engine_options(con_string: str) -> dict:
+    """Opciones de ``create_engine`` según el motor de la base de datos."""
+    url = make_url(con_string)
+    match url.get_backend_name():
+        case "sqlite":
+            return {"connect_args": {"check_same_thread": False, "timeout": 30}}
+        case "postgresql":
+            # se envían más filas por sentencia en los INSERT de varias filas
+            options: dict = {"insertmanyvalues_page_size": INSERT_PAGE_SIZE}
+            if url.get_driver_name() == "psycopg2":
+                # los UPDATE y DELETE de varias filas usan execute_batch
+                options["executemany_mode"] = "values_plus_batch"
+            return options
+    return {}
+
+
+def configure_engine(engine: Engine):
+    """Configura la conexión a la base de datos según el motor usado."""
+    if engine.dialect.name == "sqlite":
+        # pysqlite maneja las transacciones por su cuenta y rompe los
+        # savepoints; se desactiva y se emite BEGIN manualmente
+        @event.listens_for(engine, "connect")
+        def _connect(dbapi_connection, connection_record):
+            dbapi_connection.isolation_level = None
+            # WAL y synchronous=NORMAL aceleran bastante los commits
+            cursor = dbapi_connection.cursor()
+            for pragma in SQLITE_PRAGMAS:
+                cursor.execute(pragma)
+            cursor.close()
+
+        @event.listens_for(engine, "begin")
+        def _begin(connection):
+            connection.exec_driver_sql("BEGIN")
+
+
+@dataclasses.dataclass(slots=True)
+class SeenKeys:
+    """Claves de filas compartidas entre licitaciones que ya se ingresaron en
+    una sesión, para no volver a enviarlas en cada licitación."""
+
+    product_types: set[int] = dataclasses.field(default_factory=set)
+    organizations: set[str] = dataclasses.field(default_factory=set)
+
+
+def seen_keys(session: Session) -> SeenKeys:
+    return session.info.setdefault("seen_keys", SeenKeys())
+
+
+def forget_seen_keys(session: Session):
+    """Olvida las claves vistas, por ejemplo al deshacer la transacción."""
+    session.info.pop("seen_keys", None)
+
+
+def upsert(
+    session: Session, model, rows: Sequence[dict], *, update: Sequence[str] = ()
+):
+    """Inserta varias filas de ``model`` en una sola sentencia, actualizando
+    las columnas ``update`` de las que ya existen (o ignorándolas si no hay
+    columnas que actualizar).
+
+    Solo SQLite y PostgreSQL tienen ``ON CONFLICT``; con otros motores se usa
+    ``session.merge`` fila por fila."""
+    if not rows:
+        return
+    match session.get_bind().dialect.name:
+        case "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        case "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        case _:
+            for row in rows:
+                session.merge(model(**row))
+            return
+    keys = [column.name for column in model.__table__.primary_key]
+    stmt = insert(model).values(list(rows))
+    if update:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=keys, set_={name: stmt.excluded[name] for name in update}
+        )
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=keys)
+    session.execute(stmt)
+
+
 # Colocar acá la lógica a tomar cuando se agregan nuevos modelos en la
 # base datos. Por ejemplo, resolver conflictos de ID, modificar o agregar
 # filas, etc
-def merge_agil_models_into_db(session: Session, models: ParseAgilResultModels):
+def merge_agil_models_into_db(session: Session, models: ParseAgilResultModels) -> bool:
     """Agrega y/o modifica modelos en la base de datos a base de los
-    modelos de un parseo de una licitación ágil."""
-    product_types = models["product_types"]
-    for product_type in product_types.values():
-        session.merge(product_type)
+    modelos de un parseo de una licitación ágil, y entrega si la licitación
+    es nueva.
 
-    for organization in models["organizations"]:
-        session.merge(organization)
+    Si falla, la sesión queda como estaba antes de la licitación."""
+    seen = seen_keys(session)
+    product_types = [
+        product_type
+        for code, product_type in models["product_types"].items()
+        if code not in seen.product_types
+    ]
+    # una organización puede aparecer más de una vez (como organismo y
+    # como proveedor), y ON CONFLICT no admite filas repetidas
+    ruts = [
+        rut
+        for rut in dict.fromkeys(org.rut for org in models["organizations"])
+        if rut not in seen.organizations
+    ]
     bid = models["bid"]
-    already_in = session.execute(select(Bid).where(Bid.idn == bid.idn))
-    if old_bid := already_in.first():
-        pass  # todo: merging logic?
-    else:
-        session.add(models["bid"])
+
+    # todo va en un savepoint, para que un error solo deshaga esta licitación,
+    # y sin autoflush, para que la licitación se envíe en un solo flush al final
+    with session.begin_nested(), session.no_autoflush:
+        upsert(
+            session,
+            ProductType,
+            [
+                {"code": product_type.code, "name": product_type.name}
+                for product_type in product_types
+            ],
+            update=["name"],
+        )
+        upsert(session, Organization, [{"rut": rut} for rut in ruts])
+
+        # por clave primaria: si ya está en la sesión no se consulta la base de datos
+        if old_bid := session.get(Bid, bid.idn):
+            pass  # todo: merging logic?
+        else:
+            session.add(bid)
+        new = old_bid is None
+
+    seen.product_types.update(product_type.code for product_type in product_types)
+    seen.organizations.update(ruts)
+    return new
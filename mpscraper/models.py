@@ -2,9 +2,10 @@ from __future__ import annotations
 
 import enum
 from datetime import datetime, timedelta
+import decimal
 
 import sqlalchemy.sql.functions
-from sqlalchemy import Column, ForeignKey, MetaData, String, Table
+from sqlalchemy import Column, ForeignKey, MetaData, Numeric, String, Table
 from sqlalchemy.orm import (
     DeclarativeBase,
     Mapped,
@@ -27,6 +28,8 @@ class Base(DeclarativeBase):
             "pk": "pk_%(table_name)s",
         }
     )
+    # los montos de Money pueden ser int (pesos) o Decimal
+    type_annotation_map = {int | decimal.Decimal: Numeric()}
 
 
 class WithTimestamps:
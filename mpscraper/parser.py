@@ -2,8 +2,12 @@ from __future__ import annotations
 
 from datetime import datetime
 from decimal import Decimal
-import json
-from typing import Mapping, Sequence, TypedDict
+from typing import BinaryIO, Mapping, Sequence, TypedDict
+
+import bs4
+import lxml.etree
+import lxml.html
+import orjson
 
 from mpscraper.application import AgilCrawlContents
 from mpscraper.models import *
@@ -15,16 +19,45 @@ from mpscraper.validators import (
     validate_rut,
 )
 
-MP_DATETIME_FORMAT = r"%d-%m-%Y %H:%M:%S"
-MP_DATE_FORMAT = r"%d-%m-%Y"
+
+def parse_cl_decimal(value: str) -> Decimal:
+    """Parsea un número con separador de miles "." y decimal ","."""
+    return Decimal(value.replace(".", "").replace(",", "."))
 
 
 def money_from_compound(currency: str, amount: str | int | float):
     currency = "clp" if currency == "$" else currency.lower()
-    amount_dec = Decimal(amount.replace(".", "") if isinstance(amount, str) else amount)
+    if isinstance(amount, str) and currency == "clp" and "," not in amount:
+        # los montos en pesos casi nunca tienen decimales, y en ese caso basta
+        # con un int, que es mucho más barato de construir que un Decimal
+        amount = int(amount.replace(".", ""))
+    if isinstance(amount, int):
+        return Money(amount, currency)
+    amount_dec = (
+        parse_cl_decimal(amount) if isinstance(amount, str) else Decimal(amount)
+    )
     return Money(amount_dec, currency)
 
 
+# ids de las etiquetas con los datos de la página de una licitación ágil
+BID_LABEL_IDS = (
+    "lblTextName",
+    "lblTextDescription",
+    "lblFechaPublicacion",
+    "lblFechaCierre",
+    "lblPlazoEntrega",
+    "lblMonedaSymbol",
+    "lblMontoTotalDisponible",
+    "lblDescContacto",
+    "lblDescTelefono",
+    "lblDescEmail",
+    "lblNombreOrganismo",
+    "lblRutOrganismo",
+    "lblExternalCodeQuote",
+    "lblrstStatus",
+)
+
+
 class ParseAgilResultModels(TypedDict):
     bid: Bid
     product_types: Mapping[int, ProductType]
@@ -36,11 +69,11 @@ class ParseAgilResultModels(TypedDict):
 def parse_agil_into_db_model(agil: AgilCrawlContents) -> ParseAgilResultModels:
     """Parsea los contenidos de los archivos extraídos de una licitación ágil y
     genera los modelos para la base de datos."""
-    import bs4
-    import pandas
-
     # Extracción de los datos de la página de la licitación
-    main_soup = bs4.BeautifulSoup(agil.main, "html.parser")
+    main_soup = bs4.BeautifulSoup(agil.main, "lxml")
+    # la tabla del proveedor seleccionado se busca en la misma pasada
+    ids = BID_LABEL_IDS + (("gvSeleccionado",) if agil.modal_selected else ())
+    elements = elements_by_id(main_soup, ids)
     (
         title,
         summary,
@@ -56,25 +89,7 @@ def parse_agil_into_db_model(agil: AgilCrawlContents) -> ParseAgilResultModels:
         organization_rut,
         idn,
         status,
-    ) = text_by_id(
-        main_soup,
-        (
-            "lblTextName",
-            "lblTextDescription",
-            "lblFechaPublicacion",
-            "lblFechaCierre",
-            "lblPlazoEntrega",
-            "lblMonedaSymbol",
-            "lblMontoTotalDisponible",
-            "lblDescContacto",
-            "lblDescTelefono",
-            "lblDescEmail",
-            "lblNombreOrganismo",
-            "lblRutOrganismo",
-            "lblExternalCodeQuote",
-            "lblrstStatus",
-        ),
-    )
+    ) = (elements[id].text if id in elements else None for id in BID_LABEL_IDS)
 
     # Busca los productos de la licitación
     products = []
@@ -82,11 +97,13 @@ def parse_agil_into_db_model(agil: AgilCrawlContents) -> ParseAgilResultModels:
     if table := main_soup.find(id="gvCategory"):
         for row in table.find_all(class_="dccp-row"):  # type: ignore
             product_name_info, product_summary, product_amount = row.find_all("td")
-            product_name = product_name_info.find(class_="d-block").text
-            product_type = product_name_info.find(class_="text-gray").text.split(" ")[1]
-            product_type = int(product_type)
+            product_name, product_type = text_by_class(
+                product_name_info, ("d-block", "text-gray")
+            )
+            (product_amount,) = text_by_class(product_amount, ("text-font-15",))
+            product_type = int(product_type.split(" ")[1])
             product_summary = product_summary.text
-            product_amount = int(float(product_amount.find(class_="text-font-15").text))
+            product_amount = int(float(product_amount))
             product_type = product_types.setdefault(
                 product_type, ProductType(code=product_type, name=product_name)
             )
@@ -98,8 +115,8 @@ def parse_agil_into_db_model(agil: AgilCrawlContents) -> ParseAgilResultModels:
                 )
             )
 
-    published_at = datetime.strptime(published_at, MP_DATETIME_FORMAT)
-    closed_at = datetime.strptime(closed_at, MP_DATETIME_FORMAT)
+    published_at = _parse_mp_datetime(published_at)
+    closed_at = _parse_mp_datetime(closed_at)
     organization_rut = validate_rut(organization_rut, dotted=False)
     organization_name_model = OrganizationName(
         name=organization_name, organization_rut=organization_rut
@@ -128,55 +145,36 @@ def parse_agil_into_db_model(agil: AgilCrawlContents) -> ParseAgilResultModels:
     if agil.modals and agil.provider_listing:
         # En caso de que ya haya un proveedor seleccionado
         if agil.modal_selected:
-            selected_rut = validate_rut(main_soup.find(id="gvSeleccionado").find(class_="declaracion-rutRazonSocial").text)  # type: ignore
+            (selected_rut,) = text_by_class(
+                elements["gvSeleccionado"], ("declaracion-rutRazonSocial",)
+            )
+            selected_rut = validate_rut(selected_rut)  # type: ignore
         else:
             selected_rut = None
 
-        import pandas
-
-        df_applications = pandas.read_html(
-            agil.provider_listing.content, header=0, decimal=",", thousands="."
-        )[0]
-        df_applications.rename(
-            {
-                "Cotizacion": "i",
-                "Orden": "j",
-                "Rut Proveedor": "organization_rut",
-                "Razon Social": "organization_name",
-                "Nombre Producto": "product_name",
-                "Detalle Producto": "product_summary",
-                "Cantidad": "amount",
-                "Moneda": "sum_currency",
-                "Precio Unitario": "sum_per_unit",
-                "Total Impuestos": "sum_taxed",
-                "Monto Total Cotizacion": "sum_total",
-                "Codigo Solicitud Cotizacion": "bid_idn",
-            },
-            inplace=True,
-            axis=1,
+        rows = _parse_html_table(
+            agil.provider_listing.content, PROVIDER_LISTING_COLUMNS
         )
         # Al procesar la lista de proveedores, es necesario agrupar en grupos de j + 1,
         # donde j es el valor de la columna "Orden" más alto
         # Cada grupo contiene primero una fila con contenido general, y luego los
         # productos a los que postula la licitación
-        groupby = df_applications["j"].max() + 1
-        groupby = df_applications.groupby(df_applications.index // groupby)
+        # las celdas de "Orden" vacías o no numéricas no cuentan
+        orders = [int(row["j"]) for row in rows if row.get("j", "").isdecimal()]
+        group_size = max(orders, default=0) + 1
+        groups = [rows[i : i + group_size] for i in range(0, len(rows), group_size)]
 
-        assert len(agil.modals) == len(groupby)
+        assert len(agil.modals) == len(groups)
 
-        for modal, sheet in zip(agil.modals, groupby):
-            modal = json.loads(modal)[
-                "d"
-            ]  # el json es un json {"d": "..."}, donde "..." es otro json
-            modal = json.loads(modal)
+        for modal, sheet in zip(agil.modals, groups):
+            # el json es un json {"d": "..."}, donde "..." es otro json
+            modal = orjson.loads(orjson.loads(modal)["d"])
 
             # Saca la fecha de envío y descripción del json del modal
             sent_at = modal["FechaEnvio"]
             product_summary = modal["Descripcion"]
-            sent_at = datetime.strptime(sent_at, MP_DATE_FORMAT).date()
+            sent_at = _parse_mp_datetime(sent_at).date()
 
-            # entrega un dataframe como lista de diccionarios
-            sheet = sheet[1].to_dict("records")
             total_row = sheet[0]
             organization_name = total_row["organization_name"]
             organization_rut = validate_rut(total_row["organization_rut"])
@@ -184,14 +182,17 @@ def parse_agil_into_db_model(agil: AgilCrawlContents) -> ParseAgilResultModels:
             total_sum = total_row["sum_total"]
             total_sum = money_from_compound(sum_currency, total_sum)
 
-            # Procesa los productos de la postulación
-            application_products = []
-            for idx, sheet_product_row in enumerate(sheet[1:]):  # type: ignore
-                sum_amount = sheet_product_row["sum_per_unit"]
-                sum = money_from_compound(sum_currency, sum_amount)
-                application_products.append(
-                    ApplicationProduct(sum=sum, product=products[idx])
+            # Procesa los productos de la postulación, que vienen en el mismo orden
+            # que los productos de la licitación
+            product_rows = sheet[1:]
+            assert len(product_rows) == len(products)
+            application_products = [
+                ApplicationProduct(
+                    sum=money_from_compound(sum_currency, row["sum_per_unit"]),
+                    product=product,
                 )
+                for product, row in zip(products, product_rows)
+            ]
 
             application_organization = OrganizationName(
                 organization_rut=organization_rut, name=organization_name
@@ -238,14 +239,76 @@ def parse_agil_into_db_model(agil: AgilCrawlContents) -> ParseAgilResultModels:
     )
 
 
-def text_by_id(soup, ids: Sequence[str]):
-    """Busca un elemento por cada id entregada y retorna el contenido de texto
-    de cada elemento encontrado en ese orden."""
-    elements = []
-    for id in ids:
-        element = soup.find(id=id)
-        elements.append(element)
-    return [element and element.text for element in elements]
+PROVIDER_LISTING_COLUMNS = {
+    "Cotizacion": "i",
+    "Orden": "j",
+    "Rut Proveedor": "organization_rut",
+    "Razon Social": "organization_name",
+    "Nombre Producto": "product_name",
+    "Detalle Producto": "product_summary",
+    "Cantidad": "amount",
+    "Moneda": "sum_currency",
+    "Precio Unitario": "sum_per_unit",
+    "Total Impuestos": "sum_taxed",
+    "Monto Total Cotizacion": "sum_total",
+    "Codigo Solicitud Cotizacion": "bid_idn",
+}
+
+
+def _parse_html_table(
+    src: str | bytes, columns: Mapping[str, str]
+) -> list[dict[str, str]]:
+    """Lee la primera tabla de un html como una lista de diccionarios, usando la
+    primera fila como encabezado y renombrando las columnas según ``columns``."""
+    parser = lxml.html.HTMLParser(encoding="utf-8")
+    document = lxml.html.fromstring(src, parser=parser)
+    # si el archivo es solo una tabla, la raíz del documento es la misma tabla
+    table = next(document.iter("table"), None)
+    if table is None:
+        return []
+    rows = (
+        ["".join(cell.itertext()).strip() for cell in row.xpath("./th|./td")]
+        for row in table.iter("tr")
+    )
+    header = next(rows, None)
+    if header is None:
+        return []
+    header = [columns.get(name, name) for name in header]
+    return [dict(zip(header, cells)) for cells in rows]
+
+
+def elements_by_id(soup, ids: Sequence[str]) -> dict[str, bs4.Tag]:
+    """Busca un elemento por cada id entregada y los retorna según su id; las
+    ids que no se encuentran no aparecen en el resultado.
+
+    Recorre el documento una sola vez, hasta encontrar todas las ids."""
+    wanted = set(ids)
+    found = {}
+    for element in soup.descendants:
+        if not isinstance(element, bs4.Tag):
+            continue
+        id = element.get("id")
+        if id in wanted and id not in found:
+            found[id] = element
+            if len(found) == len(wanted):
+                break
+    return found
+
+
+def text_by_class(tag, classes: Sequence[str]):
+    """Busca el primer elemento dentro de ``tag`` que tenga cada clase entregada
+    y retorna su contenido de texto, recorriéndolo una sola vez."""
+    wanted = set(classes)
+    found = {}
+    for element in tag.descendants:
+        if not isinstance(element, bs4.Tag):
+            continue
+        for class_ in element.get("class", ()):
+            if class_ in wanted and class_ not in found:
+                found[class_] = element.text
+        if len(found) == len(wanted):
+            break
+    return [found.get(class_) for class_ in classes]
 
 
 class AgilSearchResult(TypedDict):
@@ -257,42 +320,73 @@ class AgilSearchResult(TypedDict):
     status: str
 
 
-def str_to_bid_status(value: str):
-    match value:
-        case "OC Emitida":
-            return BidStatus.BO_EMITTED
-        case "Cerrada":
-            return BidStatus.CLOSED
-        case "Cancelada":
-            return BidStatus.CANCELLED
-        case "Publicada":
-            return BidStatus.PUBLISHED
-    return None
-
-
-def parse_agil_search_results_html(src: str) -> Mapping[str, AgilSearchResult]:
-    """Parsea los contenidos del xls/html de los resultados de una búsqueda de licitación."""
-    import pandas
-
-    df = pandas.read_html(src, header=0, parse_dates=[3, 4])[0]
-    df.rename(
-        {
-            "ID": "idn",
-            "Nombre": "name",
-            "Unidad de compra": "buying_unit",  # ?
-            "Fecha de publicación": "published_at",
-            "Fecha de cierre": "closed_at",
-            "Estado": "status",
-            "Cotizaciones enviadas": "sent_biddings",
-            "Institución": "organization_name",
-        },
-        inplace=True,
-        axis=1,
-    )
+STR_TO_BID_STATUS: dict[str, BidStatus] = {
+    "OC Emitida": BidStatus.BO_EMITTED,
+    "Cerrada": BidStatus.CLOSED,
+    "Cancelada": BidStatus.CANCELLED,
+    "Publicada": BidStatus.PUBLISHED,
+}
+
 
-    results = {row["idn"]: row for row in df.to_dict("records")}
-    for idn, row in results.items():
-        row["published_at"] = row["published_at"].to_pydatetime()
-        row["closed_at"] = row["closed_at"].to_pydatetime()
-        row["status"] = str_to_bid_status(row["status"])
+def str_to_bid_status(value: str):
+    return STR_TO_BID_STATUS.get(value)
+
+
+AGIL_SEARCH_RESULTS_COLUMNS = {
+    "ID": "idn",
+    "Nombre": "name",
+    "Unidad de compra": "buying_unit",  # ?
+    "Fecha de publicación": "published_at",
+    "Fecha de cierre": "closed_at",
+    "Estado": "status",
+    "Cotizaciones enviadas": "sent_biddings",
+    "Institución": "organization_name",
+}
+
+
+def _parse_mp_datetime(value: str) -> datetime:
+    """Parsea una fecha de Mercado Público, "dd-mm-aaaa" seguida opcionalmente
+    de la hora como "hh:mm" o "hh:mm:ss". Separa los números a mano, que es
+    bastante más rápido que ``datetime.strptime``.
+
+    Lanza ``ValueError`` si no tiene alguno de esos formatos."""
+    date_part, _, time_part = value.partition(" ")
+    time_parts = time_part.split(":") if time_part else ()
+    if len(time_parts) not in (0, 2, 3):
+        raise ValueError(f"{value!r} no tiene un formato de fecha conocido")
+    day, month, year = date_part.split("-")
+    return datetime(int(year), int(month), int(day), *map(int, time_parts))
+
+
+def parse_mp_datetime(value: str) -> datetime | None:
+    """Como ``_parse_mp_datetime``, pero entrega ``None`` si no se puede
+    parsear."""
+    try:
+        return _parse_mp_datetime(value.strip())
+    except ValueError:
+        return None
+
+
+def parse_agil_search_results_html_stream(
+    fp: BinaryIO,
+) -> Mapping[str, AgilSearchResult]:
+    """Parsea el xls/html de los resultados de una búsqueda de licitación
+    leyéndolo fila por fila, sin cargar el documento completo a memoria."""
+    header = None
+    results = {}
+    rows = lxml.etree.iterparse(fp, tag="tr", html=True, encoding="utf-8")
+    for _, row in rows:
+        cells = ["".join(cell.itertext()).strip() for cell in row.iterchildren()]
+        # las filas ya procesadas se descartan
+        row.clear()
+        while row.getprevious() is not None:
+            del row.getparent()[0]
+        if header is None:
+            header = [AGIL_SEARCH_RESULTS_COLUMNS.get(name, name) for name in cells]
+            continue
+        result = dict(zip(header, cells))
+        result["published_at"] = parse_mp_datetime(result["published_at"])
+        result["closed_at"] = parse_mp_datetime(result["closed_at"])
+        result["status"] = str_to_bid_status(result["status"])
+        results[result["idn"]] = result
     return results  # type: ignore
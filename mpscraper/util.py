@@ -3,21 +3,20 @@ import decimal
 import enum
 import os
 import pathlib
-from typing import Iterator, Mapping, Union
+from typing import Mapping, Union
 
 from sqlalchemy import Integer, TypeDecorator
 
 FileMapping = Mapping[str, Union["FileMapping", bytes]]
 
 
-def chunks(seq, chunk_size: int) -> Iterator:
+def chunks(seq, chunk_size: int) -> list:
     """Devuelve una secuencia partida en partes de un tamaño determinado.
 
     La última parte entregada puede ser de menor tamaño.
     """
     assert chunk_size > 0
-    for idx in range(0, len(seq), chunk_size):
-        yield seq[idx : idx + chunk_size]
+    return [seq[idx : idx + chunk_size] for idx in range(0, len(seq), chunk_size)]
 
 
 class IntEnum(TypeDecorator):
@@ -41,7 +40,7 @@ class EntityType(enum.IntEnum):
     ORGANIZATION = 2
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True, frozen=True)
 class Money:
-    amount: decimal.Decimal
+    amount: int | decimal.Decimal
     currency: str
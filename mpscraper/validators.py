@@ -1,21 +1,39 @@
+import functools
 import itertools
 import re
 from typing import Literal, TypeVar
 
 import phonenumbers
 
-from mpscraper.util import chunks
+from mpscraper.const import VALIDATOR_CACHE_SIZE
 
 R = TypeVar("R")
 ParseResult = R | Literal[False]
 
 NON_DIGITS_RE = re.compile(r"\D")
+# borra todos los caracteres ASCII que no son dígitos
+NON_DIGITS_ASCII_TABLE = str.maketrans(
+    "", "", "".join(chr(c) for c in range(128) if not chr(c).isdigit())
+)
+# pesos del dígito verificador, desde el último dígito del RUT hacia atrás
+_RUT_WEIGHTS = (2, 3, 4, 5, 6, 7) * 3
 STANDARD_IDN_RE = re.compile(r"([\d.]+)-(\d|k)", re.IGNORECASE)
 EMAIL_RE = re.compile(
     r"^[a-zA-Z0-9.!#$%&’*+/=?^_`{|}~-]+@[a-zA-Z0-9-]+(?:\.[a-zA-Z0-9-]+)*$"
 )
 PRO_CODE_PATTERN = re.compile(r"PRO?\s*[-.]?\s*(?P<code>\d+)", re.IGNORECASE)
 MORE_THAN_ONE_SPACE = re.compile(r"\s\s+")
+# teléfono chileno escrito solo con dígitos y separadores comunes
+CL_PHONE_FAST_RE = re.compile(r"(?P<prefix>\+\s*56)?[\d\s()-]+")
+_CL_METADATA = phonenumbers.PhoneMetadata.metadata_for_region("CL")
+# números nacionales que libphonenumbers considera fijos o móviles en Chile
+CL_NATIONAL_NUMBER_RE = re.compile(
+    "(?:%s)|(?:%s)"
+    % (
+        _CL_METADATA.fixed_line.national_number_pattern,
+        _CL_METADATA.mobile.national_number_pattern,
+    )
+)
 """
 Formato esperado de email, sacado de `How to Validate Emails
 with Regex <https://www.abstractapi.com/tools/email-regex-guide>`_.
@@ -26,24 +44,25 @@ NAME_PREFIXES_ES = {
     "del": "del",
     "san": "San",
 }
-TITLE_IGNORE_ES = {
-    "y",
-    "e",
-    "o",
-    "u",
-    "a",
-    "al",
-    "del",
-    "de",
-    "el",
-    "la",
-    "los",
-    "las",
-    "de",
-    "del",
-    "en",
-    "para",
-}
+# palabras que se dejan en minúsculas; se comparan en minúsculas
+TITLE_IGNORE_ES = frozenset(
+    {
+        "y",
+        "e",
+        "o",
+        "u",
+        "a",
+        "al",
+        "del",
+        "de",
+        "el",
+        "la",
+        "los",
+        "las",
+        "en",
+        "para",
+    }
+)
 
 
 def _throw_leniently(leninency: bool, *args, **kwargs) -> Literal[False]:
@@ -87,14 +106,31 @@ class ValidationError(Exception):
         self.where = where
 
 
+def only_digits(value: str) -> str:
+    """Deja solo los dígitos de un texto.
+
+    ``str.translate`` es más rápido que la regex para textos cortos en ASCII,
+    como los RUT; si queda algo que no es un dígito ASCII, se usa la regex."""
+    digits = value.translate(NON_DIGITS_ASCII_TABLE)
+    if digits.isascii():
+        return digits
+    return NON_DIGITS_RE.sub("", digits)
+
+
 def rut_last_digit(rut_no_last_digit: str) -> str:
     """Calcula el dígito verificador para un RUT sin
     dígito verificador."""
     # [(2, primero), (3, segundo), ..., (7, quinto), (2, sexto), ...]
-    zipped_digits = zip(
-        itertools.cycle(range(2, 8)), map(int, tuple(reversed(rut_no_last_digit)))
+    weights = (
+        _RUT_WEIGHTS
+        if len(rut_no_last_digit) <= len(_RUT_WEIGHTS)
+        else itertools.cycle(range(2, 8))
     )
-    digit = 11 - (sum(map(lambda zipped: zipped[0] * zipped[1], zipped_digits)) % 11)
+    total = sum(
+        int(digit) * weight
+        for digit, weight in zip(reversed(rut_no_last_digit), weights)
+    )
+    digit = 11 - (total % 11)
 
     match digit:
         case 11:
@@ -105,6 +141,7 @@ def rut_last_digit(rut_no_last_digit: str) -> str:
             return str(n)
 
 
+@functools.lru_cache(maxsize=VALIDATOR_CACHE_SIZE)
 def validate_rut(rut: str, lenient: bool = False, *, dotted=True) -> ParseResult[str]:
     """Valida y normaliza un RUT"""
     _PARSING = "RUT"
@@ -116,7 +153,7 @@ def validate_rut(rut: str, lenient: bool = False, *, dotted=True) -> ParseResult
 
     if standard_idn:
         # formato con guión
-        body = NON_DIGITS_RE.sub("", standard_idn[1])
+        body = only_digits(standard_idn[1])
         last_digit = standard_idn[2]
         if rut_last_digit(body) != last_digit:
             return _throw_leniently(
@@ -128,7 +165,7 @@ def validate_rut(rut: str, lenient: bool = False, *, dotted=True) -> ParseResult
     else:
         # formato sin guion, hay que revisar si el último carácter
         # representa el dígito verificador
-        body = NON_DIGITS_RE.sub("", rut)
+        body = only_digits(rut)
         last_digit = body[-1]
         last_digit_guess = rut_last_digit(body[:-1])
         if last_digit_guess == last_digit:
@@ -145,12 +182,17 @@ def validate_rut(rut: str, lenient: bool = False, *, dotted=True) -> ParseResult
         return _throw_leniently(lenient, rut, _PARSING, "demasiado corto")
 
     if dotted:
-        # separa los dígitos con puntos
-        body = "".join(reversed(".".join(chunks("".join(reversed(body)), 3))))
+        # separa los dígitos con puntos, en grupos de 3 desde la derecha
+        head = len(body) % 3 or 3
+        body = body[:head] + "".join(
+            "." + body[i : i + 3] for i in range(head, len(body), 3)
+        )
 
-    return f"{body}-{last_digit}".lower()
+    # el rut ya viene en minúsculas, y el dígito verificador es "k" o un número
+    return f"{body}-{last_digit}"
 
 
+@functools.lru_cache(maxsize=VALIDATOR_CACHE_SIZE)
 def validate_email_address(address: str, lenient: bool = False) -> ParseResult[str]:
     """Valida y normaliza un correo electrónico."""
     _PARSING = "correo electrónico"
@@ -169,6 +211,22 @@ def validate_email_address(address: str, lenient: bool = False) -> ParseResult[s
     return f"{username}@{domain.lower()}"
 
 
+def _cl_phone_number_fast(number: str) -> str | None:
+    """Normaliza los formatos habituales de un teléfono chileno sin pasar por
+    libphonenumbers; retorna ``None`` si el número no calza y hay que revisarlo
+    con la librería."""
+    match = CL_PHONE_FAST_RE.fullmatch(number)
+    if match is None:
+        return None
+    digits = only_digits(number)
+    if match["prefix"]:
+        digits = digits[2:]
+    if len(digits) != 9 or not CL_NATIONAL_NUMBER_RE.fullmatch(digits):
+        return None
+    return f"+56{digits}"
+
+
+@functools.lru_cache(maxsize=VALIDATOR_CACHE_SIZE)
 def validate_cl_phone_number(
     number: str | int, lenient: bool = False
 ) -> ParseResult[str]:
@@ -178,6 +236,9 @@ def validate_cl_phone_number(
     number_stripped = number_stripped and number_stripped.strip()
     if not number_stripped:
         return _throw_leniently(lenient, number_stripped, _PARSING, "está vacío")
+    fast = _cl_phone_number_fast(number_stripped)
+    if fast is not None:
+        return fast
     try:
         parsed = phonenumbers.parse(number_stripped, "CL")
     except phonenumbers.NumberParseException as err:
@@ -194,13 +255,6 @@ def validate_cl_phone_number(
             _PARSING,
             "hay un carácter inválido o no se ajusta al formato",
         )
-    if not phonenumbers.is_possible_number(parsed):
-        return _throw_leniently(
-            lenient,
-            str(number),
-            _PARSING,
-            "no es un número posible",
-        )
 
     return phonenumbers.format_number(
         parsed, num_format=phonenumbers.PhoneNumberFormat.E164
@@ -227,20 +281,30 @@ def title_word_ignoring_es(value: str) -> str:
 
 
 def join_prefixed_names(full_name_parts: list[str]):
-    full_name_parts = list(full_name_parts)
-    i = 1
-    while i < len(full_name_parts) - 1:
+    """Une cada prefijo de apellido (como "de" o "san") con la palabra que le
+    sigue, en una sola pasada. La primera y la última palabra nunca se toman
+    como prefijo."""
+    last = len(full_name_parts) - 1
+    joined = []
+    i = 0
+    while i <= last:
         part = full_name_parts[i]
-        if part in NAME_PREFIXES_ES:
-            prefix = NAME_PREFIXES_ES[part]
-            full_name_parts[i : i + 2] = [" ".join([part, full_name_parts[i + 1]])]
-        i += 1
-    return full_name_parts
+        prefix = NAME_PREFIXES_ES.get(part.lower()) if 0 < i < last else None
+        if prefix is not None:
+            joined.append(f"{prefix} {full_name_parts[i + 1]}")
+            i += 2
+        else:
+            joined.append(part)
+            i += 1
+    return joined
 
 
+@functools.lru_cache(maxsize=VALIDATOR_CACHE_SIZE)
 def normalize_full_name(full_name: str) -> tuple[str, str | None]:
     full_name = full_name or ""
     parts = MORE_THAN_ONE_SPACE.sub(" ", full_name).split(" ")
+    # capitalize() también deja el resto de la palabra en minúsculas
+    parts = [part.lower() for part in parts]
     parts = [
         part.capitalize() if part not in TITLE_IGNORE_ES else part for part in parts
     ]